@@ -0,0 +1,65 @@
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, insert
+from sqlalchemy.exc import OperationalError
+
+from db.database import SQLITE_PRAGMAS, create_db_engine
+
+metadata = MetaData()
+bench = Table(
+    "bench",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("worker", Integer),
+    Column("payload", String),
+)
+
+
+def run_commits(engine, threads: int, commits: int) -> tuple[float, int]:
+    """threads 个线程各自提交 commits 次单行事务，返回每秒提交数和锁冲突次数"""
+    locked = 0
+    lock = threading.Lock()
+
+    def worker(n: int):
+        nonlocal locked
+        for i in range(commits):
+            try:
+                with engine.begin() as conn:
+                    conn.execute(
+                        insert(bench).values(worker=n, payload=f"payload-{i}" * 10)
+                    )
+            except OperationalError:
+                with lock:
+                    locked += 1
+
+    start_time = time.perf_counter()
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start_time
+    return (threads * commits - locked) / elapsed, locked
+
+
+def main(threads: int = 4, commits: int = 500):
+    profiles = {"默认配置": None, "SQLITE_PRAGMAS": SQLITE_PRAGMAS}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, pragmas in profiles.items():
+            path = os.path.join(tmp, f"{len(os.listdir(tmp))}.db")
+            engine = create_db_engine(f"sqlite:///{path}", pragmas=pragmas)
+            metadata.create_all(engine)
+            single, _ = run_commits(engine, 1, commits)
+            multi, locked = run_commits(engine, threads, commits)
+            engine.dispose()
+            print(
+                f"{name}: 单线程 {single:.0f} commits/s，"
+                f"{threads} 线程 {multi:.0f} commits/s（database is locked {locked} 次）"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import logging
+import random
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
+import requests
+
+# 视为上游故障的状态码，连接失败和超时同样计入
+FAILURE_STATUS = {403, 418, 429}
+# 资源不存在，重试也不会成功的状态码
+PERMANENT_STATUS = {404, 410}
+# 同一接口连续失败多少次后熔断
+BREAKER_FAILURE_THRESHOLD = 5
+# 首次熔断的秒数，试探失败时加倍，最长 BREAKER_OPEN_MAX_SECONDS
+BREAKER_OPEN_SECONDS = 30
+BREAKER_OPEN_MAX_SECONDS = 600
+# 重试次数最多为已启动任务数的 RETRY_RATIO 倍，另有每秒 RETRY_MIN_PER_SECOND 次的保底
+RETRY_RATIO = 0.1
+RETRY_MIN_PER_SECOND = 0.2
+RETRY_MAX_TOKENS = 20
+
+
+class CircuitOpenError(Exception):
+    """接口处于熔断状态，请求未发出"""
+
+    def __init__(self, endpoint: str, retry_at: float):
+        super().__init__(f"Circuit open for {endpoint}")
+        self.endpoint = endpoint
+        self.retry_at = retry_at
+
+
+def endpoint_key(url: str) -> str:
+    """host 加第一级路径，例如 www.douban.com/personage、m.douban.com/rexxar"""
+    parts = urlsplit(url)
+    path = parts.path.strip("/").split("/", 1)[0]
+    return f"{parts.hostname or ''}/{path}"
+
+
+def is_failure(status: Optional[int]) -> bool:
+    """status 为 None 表示连接失败或超时"""
+    return status is None or status in FAILURE_STATUS or status >= 500
+
+
+def error_status(exc: BaseException) -> Optional[int]:
+    """HTTP 错误的状态码（requests 和 aiohttp），其他异常返回 None"""
+    if isinstance(exc, requests.HTTPError):
+        return exc.response.status_code if exc.response is not None else None
+    status = getattr(exc, "status", None)
+    return status if isinstance(status, int) else None
+
+
+def error_name(exc: BaseException) -> str:
+    """记录到任务表中的错误类型，HTTP 错误带上状态码，例如 HTTPError:404"""
+    status = error_status(exc)
+    name = type(exc).__name__
+    return f"{name}:{status}" if status is not None else name
+
+
+def is_permanent(exc: BaseException) -> bool:
+    """页面不存在，任务可以直接放弃"""
+    return error_status(exc) in PERMANENT_STATUS
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """熔断、连接失败、超时和上游故障状态码值得重试，其余错误（404、登录页、解析失败）重试也没有用"""
+    if isinstance(exc, CircuitOpenError):
+        return True
+    if isinstance(exc, requests.HTTPError):
+        response = exc.response
+        return response is None or is_failure(response.status_code)
+    return isinstance(exc, requests.RequestException)
+
+
+class _Breaker:
+    """单个接口的熔断状态"""
+
+    def __init__(self):
+        self.failures = 0
+        self.open_seconds = BREAKER_OPEN_SECONDS
+        self.open_until = 0.0
+        # 熔断到期后只放一个请求试探，成功才恢复
+        self.probing = False
+        self.probe_inflight = False
+
+
+class CircuitBreakers:
+    """
+    按接口（host + 第一级路径）熔断。
+    同一接口连续失败 failure_threshold 次后熔断，熔断期间请求直接抛出 CircuitOpenError，不再发出；
+    到期后先放一个请求试探，成功则恢复，失败则熔断时间加倍。
+    客户端每次请求前调用 before()，请求后调用 record() 反馈状态码。
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        open_seconds: float = BREAKER_OPEN_SECONDS,
+    ):
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self._breakers: dict[str, _Breaker] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, endpoint: str) -> _Breaker:
+        breaker = self._breakers.get(endpoint)
+        if breaker is None:
+            breaker = self._breakers[endpoint] = _Breaker()
+            breaker.open_seconds = self.open_seconds
+        return breaker
+
+    def before(self, url: str):
+        """熔断中时抛出 CircuitOpenError"""
+        endpoint = endpoint_key(url)
+        with self._lock:
+            breaker = self._get(endpoint)
+            now = time.time()
+            if breaker.open_until > now:
+                raise CircuitOpenError(endpoint, breaker.open_until)
+            if breaker.probing:
+                if breaker.probe_inflight:
+                    raise CircuitOpenError(endpoint, now + 1)
+                breaker.probe_inflight = True
+
+    def record(self, url: str, status: Optional[int]):
+        endpoint = endpoint_key(url)
+        with self._lock:
+            breaker = self._get(endpoint)
+            if not is_failure(status):
+                breaker.failures = 0
+                if breaker.probing:
+                    breaker.probing = breaker.probe_inflight = False
+                    breaker.open_seconds = self.open_seconds
+                    logging.info(f"Circuit for {endpoint} closed")
+                return
+            breaker.failures += 1
+            # 已熔断时，熔断前发出的请求陆续失败不再重复计算
+            if breaker.open_until > time.time():
+                return
+            if breaker.probing:
+                breaker.probe_inflight = False
+                breaker.open_seconds = min(
+                    breaker.open_seconds * 2, BREAKER_OPEN_MAX_SECONDS
+                )
+            elif breaker.failures < self.failure_threshold:
+                return
+            breaker.open_until = time.time() + breaker.open_seconds
+            breaker.probing = True
+            breaker.failures = 0
+            logging.warning(
+                f"Circuit for {endpoint} opened for {breaker.open_seconds:.0f}s "
+                f"(status {status})"
+            )
+
+    def open_until(self) -> float:
+        """所有熔断中的接口里最晚恢复的时间，没有熔断时返回 0"""
+        with self._lock:
+            now = time.time()
+            return max(
+                (
+                    breaker.open_until
+                    for breaker in self._breakers.values()
+                    if breaker.open_until > now
+                ),
+                default=0.0,
+            )
+
+    def metrics(self) -> dict[str, str]:
+        with self._lock:
+            now = time.time()
+            return {
+                endpoint: (
+                    "open"
+                    if breaker.open_until > now
+                    else "half-open" if breaker.probing else "closed"
+                )
+                for endpoint, breaker in self._breakers.items()
+            }
+
+
+class RetryBudget:
+    """
+    全局重试预算：每启动一个任务存入 ratio 个令牌，另按 min_per_second 匀速补充，
+    每次重试取走一个令牌，取不到时放弃重试。上游整体故障时重试量不会成倍放大请求量。
+    """
+
+    def __init__(
+        self,
+        ratio: float = RETRY_RATIO,
+        min_per_second: float = RETRY_MIN_PER_SECOND,
+        max_tokens: float = RETRY_MAX_TOKENS,
+    ):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self.updated_at = time.monotonic()
+        self.retried = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def _refill(self, deposit: float = 0.0):
+        now = time.monotonic()
+        self.tokens = min(
+            self.max_tokens,
+            self.tokens + (now - self.updated_at) * self.min_per_second + deposit,
+        )
+        self.updated_at = now
+
+    def deposit(self):
+        """启动一个任务时调用"""
+        with self._lock:
+            self._refill(self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            self._refill()
+            if self.tokens < 1:
+                self.rejected += 1
+                return False
+            self.tokens -= 1
+            self.retried += 1
+            return True
+
+
+def retry_delay(attempt: int, base: float = 2, max_delay: float = 60) -> float:
+    """第 attempt 次重试前的等待秒数：指数退避加随机抖动"""
+    delay = min(base * 2 ** (attempt - 1), max_delay)
+    return delay * random.uniform(0.5, 1.5)
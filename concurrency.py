@@ -0,0 +1,105 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+# 视为被限流的状态码
+THROTTLE_STATUS = {403, 418, 429}
+
+
+class AIMDController:
+    """
+    AIMD 并发控制器：请求正常时每完成一轮（与当前并发数相同的请求数）并发数加 1，
+    遇到限流状态码、5xx、连接失败或慢响应时并发数减半，减半后 cooldown_seconds 内不再重复减半。
+    工作线程执行任务前通过 slot() 取得并发名额，客户端每次请求后调用 observe() 反馈结果。
+    """
+
+    def __init__(
+        self,
+        max_limit: int,
+        min_limit: int = 1,
+        initial: Optional[int] = None,
+        slow_seconds: float = 5.0,
+        decrease_factor: float = 0.5,
+        cooldown_seconds: float = 10.0,
+    ):
+        if not 1 <= min_limit <= max_limit:
+            raise ValueError("Require 1 <= min_limit <= max_limit.")
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = min(max(initial or min_limit, min_limit), max_limit)
+        self.slow_seconds = slow_seconds
+        self.decrease_factor = decrease_factor
+        self.cooldown_seconds = cooldown_seconds
+        self.inflight = 0
+        self.requests = 0
+        self.throttled = 0
+        self.slow = 0
+        self._successes = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """阻塞直到在途任务数小于当前并发数"""
+        with self._cond:
+            while self.inflight >= self.limit:
+                self._cond.wait()
+            self.inflight += 1
+
+    def release(self):
+        with self._cond:
+            self.inflight -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def observe(self, latency: float, status: Optional[int]):
+        """记录一次请求的耗时和状态码，status 为 None 表示连接失败或超时"""
+        throttled = status is None or status in THROTTLE_STATUS or status >= 500
+        slow = latency > self.slow_seconds
+        with self._cond:
+            self.requests += 1
+            if throttled or slow:
+                if throttled:
+                    self.throttled += 1
+                else:
+                    self.slow += 1
+                self._decrease("throttled" if throttled else "slow response")
+                return
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.max_limit:
+                self._successes = 0
+                self.limit += 1
+                self._cond.notify()
+                logging.debug(f"Concurrency limit increased to {self.limit}")
+
+    def _decrease(self, reason: str):
+        self._successes = 0
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown_seconds:
+            return
+        self._last_decrease = now
+        limit = max(self.min_limit, int(self.limit * self.decrease_factor))
+        if limit < self.limit:
+            logging.warning(
+                f"Concurrency limit decreased from {self.limit} to {limit} ({reason})"
+            )
+            self.limit = limit
+
+    def metrics(self) -> dict[str, int]:
+        """当前状态，供日志和监控读取"""
+        with self._cond:
+            return {
+                "limit": self.limit,
+                "inflight": self.inflight,
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "slow": self.slow,
+            }
@@ -1,14 +1,226 @@
-from typing import List, Dict
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
 
+# 多进程共享的 cookie 状态文件
+COOKIE_POOL_DB = "./cookie_pool.db"
+# 每个 cookie 在一个窗口内最多发出的需要登录的请求数
+COOKIE_BUDGET = 200
+COOKIE_WINDOW_SECONDS = 3600
+# 遇到登录页后的隔离秒数，连续失效时加倍，最长 COOKIE_QUARANTINE_MAX_SECONDS
+COOKIE_QUARANTINE_SECONDS = 1800
+COOKIE_QUARANTINE_MAX_SECONDS = 24 * 3600
+# 领取 cookie 时最多等待的秒数，远短于任务租约，超过后放弃本次任务并释放租约
+COOKIE_MAX_WAIT_SECONDS = 60
 
-class CookieRotator:
-    def __init__(self, cookies_list: List[Dict[str, str]]):
+
+class CookieUnavailableError(Exception):
+    """等待 cookie 超时：所有 cookie 都被隔离或额度已用完"""
+
+    def __init__(self, ready_at: float):
+        super().__init__(
+            f"No cookie available until {time.strftime('%H:%M:%S', time.localtime(ready_at))}"
+        )
+        self.ready_at = ready_at
+
+
+def cookie_key(cookie: Dict[str, str]) -> str:
+    return hashlib.sha1(json.dumps(cookie, sort_keys=True).encode("utf-8")).hexdigest()[
+        :16
+    ]
+
+
+class CookiePool:
+    """
+    带健康状态的 cookie 池。
+    每次领取最久未使用、未被隔离且窗口内额度未用完的 cookie；遇到登录页的 cookie 被隔离一段时间。
+    额度按请求数计算：领取时预扣预计的请求数，翻页等额外请求发出后再用 charge() 补扣。
+    领取任务前先用 ready_at() 确认有可用的 cookie，避免领到任务后长时间等待 cookie 而租约过期。
+    状态保存在 SQLite 中，每次领取都在一个写事务里完成，多个线程和进程共用同一组状态。
+    """
+
+    def __init__(
+        self,
+        cookies_list: List[Dict[str, str]],
+        path: str = COOKIE_POOL_DB,
+        budget: int = COOKIE_BUDGET,
+        window_seconds: float = COOKIE_WINDOW_SECONDS,
+        quarantine_seconds: float = COOKIE_QUARANTINE_SECONDS,
+    ):
         if not cookies_list:
             raise ValueError("Cookies list cannot be empty.")
-        self.cookies_list = cookies_list
-        self.index = -1  # 初始化索引
+        self.cookies = {cookie_key(cookie): cookie for cookie in cookies_list}
+        self.path = path
+        self.budget = budget
+        self.window_seconds = window_seconds
+        self.quarantine_seconds = quarantine_seconds
+        self._local = threading.local()
+        # 所有线程的连接，close() 时一起关闭
+        self._connections: list[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._db().execute(
+            "CREATE TABLE IF NOT EXISTS cookies ("
+            "key TEXT PRIMARY KEY, last_used_at REAL NOT NULL, "
+            "window_start REAL NOT NULL, used INTEGER NOT NULL, "
+            "quarantined_until REAL NOT NULL, failures INTEGER NOT NULL)"
+        )
+
+    def _db(self) -> sqlite3.Connection:
+        """每个线程使用自己的连接，事务显式控制"""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            # 只在创建它的线程中使用，允许 close() 在其他线程关闭
+            db = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None, check_same_thread=False
+            )
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+            with self._connections_lock:
+                self._connections.append(db)
+        return db
+
+    def _states(self, db: sqlite3.Connection, now: float) -> dict[str, list]:
+        """本池中每个 cookie 的状态 [上次使用, 窗口开始, 已用次数, 隔离到期, 连续失效次数]"""
+        states = {key: [0.0, now, 0, 0.0, 0] for key in self.cookies}
+        for key, *state in db.execute(
+            "SELECT key, last_used_at, window_start, used, quarantined_until, failures "
+            "FROM cookies"
+        ):
+            if key in states:
+                states[key] = state
+        return states
+
+    def _availability(
+        self, db: sqlite3.Connection, now: float
+    ) -> tuple[dict[str, tuple], list[float]]:
+        """(可用的 cookie -> 状态, 不可用的 cookie 各自恢复可用的时间)"""
+        available = {}
+        ready_at = []
+        for key, (
+            last_used_at,
+            window_start,
+            used,
+            until,
+            failures,
+        ) in self._states(db, now).items():
+            if now - window_start >= self.window_seconds:
+                window_start, used = now, 0
+            if until > now:
+                ready_at.append(until)
+            elif used >= self.budget:
+                ready_at.append(window_start + self.window_seconds)
+            else:
+                available[key] = (last_used_at, window_start, used, until, failures)
+        return available, ready_at
+
+    def ready_at(self) -> float:
+        """有可用的 cookie 时返回 0，否则返回最早恢复可用的时间；不领取"""
+        now = time.time()
+        available, ready_at = self._availability(self._db(), now)
+        return 0.0 if available else min(ready_at)
+
+    def try_acquire(self, requests: int = 1) -> tuple[Dict[str, str] | None, float]:
+        """领取一个 cookie 并预扣 requests 次额度；没有可用的 cookie 时返回 (None, 最早可用的时间)"""
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            available, ready_at = self._availability(db, now)
+            if not available:
+                db.execute("COMMIT")
+                return None, min(ready_at)
+            key = min(available, key=lambda key: available[key][0])
+            _, window_start, used, until, failures = available[key]
+            db.execute(
+                "INSERT OR REPLACE INTO cookies VALUES (?, ?, ?, ?, ?, ?)",
+                (key, now, window_start, used + requests, until, failures),
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return self.cookies[key], now
+
+    def acquire(
+        self,
+        requests: int = 1,
+        max_wait: Optional[float] = COOKIE_MAX_WAIT_SECONDS,
+    ) -> Dict[str, str]:
+        """
+        领取一个可用的 cookie，预扣 requests 次请求的额度。
+        最多等待 max_wait 秒（None 表示一直等待），仍没有可用的 cookie 时抛出 CookieUnavailableError。
+        """
+        deadline = None if max_wait is None else time.time() + max_wait
+        while True:
+            cookie, ready_at = self.try_acquire(requests)
+            if cookie is not None:
+                return cookie
+            if deadline is not None and ready_at > deadline:
+                raise CookieUnavailableError(ready_at)
+            wait = ready_at - time.time()
+            logging.warning(f"No cookie available, waiting {wait:.0f} seconds")
+            time.sleep(min(max(wait, 1), 60))
+
+    def _update(
+        self, cookie: Dict[str, str], quarantine: Optional[bool], requests: int = 0
+    ):
+        """quarantine 为 None 时只补扣 requests 次额度，不改变健康状态"""
+        key = cookie_key(cookie)
+        if key not in self.cookies:
+            return
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            last_used_at, window_start, used, until, failures = self._states(db, now)[
+                key
+            ]
+            if now - window_start >= self.window_seconds:
+                window_start, used = now, 0
+            used += requests
+            if quarantine:
+                failures += 1
+                seconds = min(
+                    self.quarantine_seconds * 2 ** (failures - 1),
+                    COOKIE_QUARANTINE_MAX_SECONDS,
+                )
+                until = now + seconds
+                logging.warning(
+                    f"Cookie {key} hit the login page, quarantined for {seconds:.0f} seconds"
+                )
+            elif quarantine is not None:
+                failures = 0
+            db.execute(
+                "INSERT OR REPLACE INTO cookies VALUES (?, ?, ?, ?, ?, ?)",
+                (key, last_used_at, window_start, used, until, failures),
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def charge(self, cookie: Dict[str, str], requests: int):
+        """补扣领取时没有预扣的请求额度，例如翻页请求"""
+        if requests > 0:
+            self._update(cookie, quarantine=None, requests=requests)
+
+    def report_ok(self, cookie: Dict[str, str]):
+        """cookie 正常取得了需要登录的页面"""
+        self._update(cookie, quarantine=False)
+
+    def report_login_required(self, cookie: Dict[str, str]):
+        """cookie 被重定向到登录页，隔离一段时间"""
+        self._update(cookie, quarantine=True)
 
-    def get_next_cookie(self) -> Dict[str, str]:
-        """循环获取下一个 cookie"""
-        self.index = (self.index + 1) % len(self.cookies_list)
-        return self.cookies_list[self.index]
+    def close(self):
+        """关闭所有线程的连接"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for db in connections:
+            db.close()
+        self._local = threading.local()
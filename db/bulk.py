@@ -0,0 +1,49 @@
+import logging
+import time
+from typing import Iterable
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+
+def insert_ignore(db: Session, model, rows: list[dict]) -> int:
+    """
+    用一条 INSERT ... ON CONFLICT DO NOTHING 以 executemany 方式批量写入（不提交），
+    主键已存在的行直接跳过，不需要逐条查询。返回实际插入的行数。
+    """
+    if not rows:
+        return 0
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        stmt = postgresql.insert(model.__table__)
+    else:
+        stmt = sqlite.insert(model.__table__)
+    result = db.execute(stmt.on_conflict_do_nothing(), rows)
+    return max(result.rowcount, 0)
+
+
+def bulk_load(
+    db: Session, model, chunks: Iterable[list[dict]], chunk_per_commit: int = 10
+):
+    """
+    分块写入，每 chunk_per_commit 块提交一次，并按块输出写入速度。
+    返回 (读取行数, 插入行数)。
+    """
+    total = inserted = 0
+    start_time = time.time()
+    for i, rows in enumerate(chunks, start=1):
+        inserted += insert_ignore(db, model, rows)
+        total += len(rows)
+        if i % chunk_per_commit == 0:
+            db.commit()
+        elapsed = time.time() - start_time
+        logging.info(
+            f"Loaded {total} rows ({inserted} new) into {model.__tablename__}, {total / max(elapsed, 1e-6):.0f} rows/s"
+        )
+    db.commit()
+    elapsed = time.time() - start_time
+    logging.info(
+        f"Finished loading {total} rows, {inserted} new, {total - inserted} already existed, "
+        f"in {elapsed:.2f} seconds ({total / max(elapsed, 1e-6):.0f} rows/s)"
+    )
+    return total, inserted
@@ -1,7 +1,49 @@
+import os
+import random
+import socket
+import uuid
+from datetime import datetime, timedelta
 from db import schemas, models
-from sqlalchemy.orm import Session
-from typing import Literal, Sequence
-from sqlalchemy import func
+from sqlalchemy.orm import Query, Session
+from typing import Any, Callable, Literal, Sequence
+from sqlalchemy import and_, false, func, or_, select
+
+# 默认租约时长（秒），超过后任务会被重新分配
+LEASE_SECONDS = 600
+# 任务失败后再次领取前的等待秒数，每多失败一次加倍，最长 RETRY_MAX_SECONDS
+RETRY_BASE_SECONDS = 300
+RETRY_MAX_SECONDS = 24 * 3600
+# 失败这么多次后放弃任务（死信），不再领取
+MAX_ATTEMPTS = 8
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _take_by_rand_key(query: Query, model, limit: int, shuffle: bool = True):
+    """
+    沿 rand_key 部分索引取 limit 条任务，复杂度 O(log n + limit)。
+    shuffle 为 True 时从随机位置开始取，取到末尾不足时从头补齐，
+    多个进程同时取任务时各自落在不同的分片上。
+    """
+    if not shuffle:
+        return query.order_by(model.rand_key).limit(limit).all()
+    start = random.randrange(models.RAND_KEY_SPACE)
+    tasks = (
+        query.filter(model.rand_key >= start)
+        .order_by(model.rand_key)
+        .limit(limit)
+        .all()
+    )
+    if len(tasks) < limit:
+        tasks += (
+            query.filter(model.rand_key < start)
+            .order_by(model.rand_key)
+            .limit(limit - len(tasks))
+            .all()
+        )
+    return tasks
 
 
 def get_unfinished_marking(
@@ -13,12 +55,8 @@ def get_unfinished_marking(
         "requirement_4",
     ],
 ):
-    return (
-        db.query(models.Marking)
-        .filter(getattr(models.Marking, filter) == False)
-        .order_by(func.random())
-        .first()
-    )
+    tasks = get_unfinished_marking_mutil(db, filter, 1)
+    return tasks[0] if tasks else None
 
 
 def change_marking_status(
@@ -54,14 +92,11 @@ def get_unfinished_marking_mutil(
         "requirement_4",
     ],
     limit: int,
+    shuffle: bool = True,
 ):
-    return (
-        db.query(models.Marking)
-        .filter(getattr(models.Marking, filter) == False)
-        .order_by(func.random())
-        .limit(limit)
-        .all()
-    )
+    # 使用字面量 false()，SQLite 才能匹配上部分索引的 WHERE 条件
+    query = db.query(models.Marking).filter(getattr(models.Marking, filter) == false())
+    return _take_by_rand_key(query, models.Marking, limit, shuffle)
 
 
 def change_subject_marking_status(
@@ -96,16 +131,31 @@ def get_unfinished_subject_marking_mutil(
     ],
     limit: int,
     type: Literal["movie", "book", "music"] | None = None,
+    shuffle: bool = True,
 ):
     query = db.query(models.SubjectMarking).filter(
-        getattr(models.SubjectMarking, filter) == False
+        getattr(models.SubjectMarking, filter) == false()
     )
     if type is not None:
         query = query.filter(models.SubjectMarking.type == type)
-    return query.order_by(func.random()).limit(limit).all()
+    return _take_by_rand_key(query, models.SubjectMarking, limit, shuffle)
+
 
+def get_works_counts(
+    db: Session, douban_person_ids: Sequence[str]
+) -> dict[str, str | None]:
+    """requirement_1 记录的影视作品数，没有采集过的人物不在结果中"""
+    if not douban_person_ids:
+        return {}
+    rows = db.query(
+        models.DoubanPerson.douban_person_id, models.DoubanPerson.works_count
+    ).filter(models.DoubanPerson.douban_person_id.in_(douban_person_ids))
+    return {douban_person_id: works_count for douban_person_id, works_count in rows}
 
-def create_douban_person(db: Session, douban_person: schemas.DoubanPersonCreate):
+
+def create_douban_person(
+    db: Session, douban_person: schemas.DoubanPersonCreate, commit: bool = True
+):
     if (
         db.query(models.DoubanPerson)
         .filter(models.DoubanPerson.douban_person_id == douban_person.douban_person_id)
@@ -115,89 +165,604 @@ def create_douban_person(db: Session, douban_person: schemas.DoubanPersonCreate)
         return None
     new_douban_person = models.DoubanPerson(**douban_person.model_dump())
     db.add(new_douban_person)
-    db.commit()
-    db.refresh(new_douban_person)
+    if commit:
+        db.commit()
+        db.refresh(new_douban_person)
     return new_douban_person
 
 
 def create_award_info_mutil(
-    db: Session, award_info_list: Sequence[schemas.AwardInfoCreate]
+    db: Session, award_info_list: Sequence[schemas.AwardInfoCreate], commit: bool = True
 ):
     award_info_list = [
         models.AwardInfo(**award_info.model_dump()) for award_info in award_info_list
     ]
     db.add_all(award_info_list)
-    db.commit()
+    if commit:
+        db.commit()
     return award_info_list
 
 
 def create_collaborations_mutil(
-    db: Session, collaborations_list: Sequence[schemas.CollaborationInfoCreate]
+    db: Session,
+    collaborations_list: Sequence[schemas.CollaborationInfoCreate],
+    commit: bool = True,
 ):
     collaborations_list = [
         models.CollaborationInfo(**collaboration.model_dump())
         for collaboration in collaborations_list
     ]
     db.add_all(collaborations_list)
-    db.commit()
+    if commit:
+        db.commit()
     return collaborations_list
 
 
 def create_douban_works_mutil(
-    db: Session, works_list: Sequence[schemas.DoubanWorkCreate]
+    db: Session, works_list: Sequence[schemas.DoubanWorkCreate], commit: bool = True
 ):
     works_list = [models.DoubanWork(**work.model_dump()) for work in works_list]
     db.add_all(works_list)
-    db.commit()
+    if commit:
+        db.commit()
     return works_list
 
 
-def create_movie(db: Session, movie: schemas.MovieCreate):
+def create_movie(db: Session, movie: schemas.MovieCreate, commit: bool = True):
     new_movie = models.Movie(**movie.model_dump())
     db.add(new_movie)
-    db.commit()
-    db.refresh(new_movie)
+    if commit:
+        db.commit()
+        db.refresh(new_movie)
     return new_movie
 
 
-def create_book(db: Session, book: schemas.BookCreate):
+def create_book(db: Session, book: schemas.BookCreate, commit: bool = True):
     new_book = models.Book(**book.model_dump())
     db.add(new_book)
-    db.commit()
-    db.refresh(new_book)
+    if commit:
+        db.commit()
+        db.refresh(new_book)
     return new_book
 
 
-def create_music(db: Session, music: schemas.MusicCreate):
+def create_music(db: Session, music: schemas.MusicCreate, commit: bool = True):
     new_music = models.Music(**music.model_dump())
     db.add(new_music)
-    db.commit()
-    db.refresh(new_music)
+    if commit:
+        db.commit()
+        db.refresh(new_music)
     return new_music
 
 
-def create_subject_award(db: Session, subject_award: schemas.SubjectAwardCreate):
+def create_subject_award(
+    db: Session, subject_award: schemas.SubjectAwardCreate, commit: bool = True
+):
     new_subject_award = models.SubjectAward(**subject_award.model_dump())
     db.add(new_subject_award)
-    db.commit()
-    db.refresh(new_subject_award)
+    if commit:
+        db.commit()
+        db.refresh(new_subject_award)
     return new_subject_award
 
 
 def create_subject_awards_mutil(
-    db: Session, subject_awards_list: Sequence[schemas.SubjectAwardCreate]
+    db: Session,
+    subject_awards_list: Sequence[schemas.SubjectAwardCreate],
+    commit: bool = True,
 ):
     subject_awards_list = [
         models.SubjectAward(**subject_award.model_dump())
         for subject_award in subject_awards_list
     ]
     db.add_all(subject_awards_list)
-    db.commit()
+    if commit:
+        db.commit()
     return subject_awards_list
 
 
-def create_casts_mutil(db: Session, casts_list: Sequence[schemas.CastCreate]):
+def create_casts_mutil(
+    db: Session, casts_list: Sequence[schemas.CastCreate], commit: bool = True
+):
     casts_list = [models.Cast(**cast.model_dump()) for cast in casts_list]
     db.add_all(casts_list)
-    db.commit()
+    if commit:
+        db.commit()
     return casts_list
+
+
+def _claim(
+    db: Session,
+    model,
+    key_column,
+    query: Query,
+    filter: str,
+    limit: int,
+    worker_id: str,
+    lease_seconds: int,
+    shuffle: bool,
+):
+    """
+    先沿索引挑出候选任务，再用一条带条件的 UPDATE 原子地写入租约，
+    条件里重新检查租约，因此并发领取时同一行只会被一个领取者拿到。
+    失败后尚未到重试时间的任务和死信任务不会被领取。
+    """
+    now = datetime.now()
+    lease_column = getattr(model, f"{filter}_lease_expires_at")
+    claimed_by_column = getattr(model, f"{filter}_claimed_by")
+    next_eligible_column = getattr(model, f"{filter}_next_eligible_at")
+    available = and_(
+        or_(lease_column.is_(None), lease_column < now),
+        or_(next_eligible_column.is_(None), next_eligible_column <= now),
+        getattr(model, f"{filter}_dead") == false(),
+    )
+    candidates = _take_by_rand_key(query.filter(available), model, limit, shuffle)
+    if not candidates:
+        return []
+    ids = [getattr(candidate, key_column.key) for candidate in candidates]
+    # 每次领取使用唯一的标记，便于取回本次真正领到的行
+    token = f"{worker_id}#{uuid.uuid4().hex[:8]}"
+    db.query(model).filter(
+        key_column.in_(ids), getattr(model, filter) == false(), available
+    ).update(
+        {
+            claimed_by_column: token,
+            lease_column: now + timedelta(seconds=lease_seconds),
+        },
+        synchronize_session=False,
+    )
+    db.commit()
+    tasks = (
+        db.query(model).filter(key_column.in_(ids), claimed_by_column == token).all()
+    )
+    # 任务会交给其他线程处理，从 session 中移除，避免之后的提交使其过期
+    for task in tasks:
+        db.expunge(task)
+    return tasks
+
+
+def claim_marking_mutil(
+    db: Session,
+    filter: Literal[
+        "requirement_1",
+        "requirement_2",
+        "requirement_3",
+        "requirement_4",
+    ],
+    limit: int,
+    worker_id: str | None = None,
+    lease_seconds: int = LEASE_SECONDS,
+    shuffle: bool = True,
+):
+    """领取最多 limit 条未完成且未被租用（或租约已过期）的任务"""
+    query = db.query(models.Marking).filter(getattr(models.Marking, filter) == false())
+    return _claim(
+        db,
+        models.Marking,
+        models.Marking.douban_person_id,
+        query,
+        filter,
+        limit,
+        worker_id or default_worker_id(),
+        lease_seconds,
+        shuffle,
+    )
+
+
+def claim_subject_marking_mutil(
+    db: Session,
+    filter: Literal[
+        "requirement_5",
+        "requirement_6",
+        "requirement_7",
+    ],
+    limit: int,
+    type: Literal["movie", "book", "music"] | None = None,
+    worker_id: str | None = None,
+    lease_seconds: int = LEASE_SECONDS,
+    shuffle: bool = True,
+):
+    query = db.query(models.SubjectMarking).filter(
+        getattr(models.SubjectMarking, filter) == false()
+    )
+    if type is not None:
+        query = query.filter(models.SubjectMarking.type == type)
+    return _claim(
+        db,
+        models.SubjectMarking,
+        models.SubjectMarking.douban_subject_id,
+        query,
+        filter,
+        limit,
+        worker_id or default_worker_id(),
+        lease_seconds,
+        shuffle,
+    )
+
+
+def _mark_empty(db: Session, model, key_column, filter: str, empty_ids) -> int:
+    """
+    把 empty_ids（子查询）中未完成、未被租用的任务直接标记为完成，不写入结果行。
+    返回标记的任务数。
+    """
+    lease_column = getattr(model, f"{filter}_lease_expires_at")
+    updated = (
+        db.query(model)
+        .filter(
+            getattr(model, filter) == false(),
+            or_(lease_column.is_(None), lease_column < datetime.now()),
+            key_column.in_(empty_ids),
+        )
+        .update(
+            {
+                getattr(model, filter): True,
+                f"{filter}_claimed_by": None,
+                f"{filter}_lease_expires_at": None,
+            },
+            synchronize_session=False,
+        )
+    )
+    db.commit()
+    return updated
+
+
+def mark_empty_marking(
+    db: Session,
+    filter: Literal["requirement_3", "requirement_4"],
+) -> int:
+    """
+    requirement_1 已证明没有获奖（awards_count 为 0）或没有合作人物（co_star_count 为 0）的人物，
+    对应任务无需请求，直接标记完成。
+    """
+    count_column = {
+        "requirement_3": models.DoubanPerson.awards_count,
+        "requirement_4": models.DoubanPerson.co_star_count,
+    }[filter]
+    empty_ids = select(models.DoubanPerson.douban_person_id).where(count_column == "0")
+    return _mark_empty(
+        db, models.Marking, models.Marking.douban_person_id, filter, empty_ids
+    )
+
+
+def mark_empty_subject_marking(
+    db: Session,
+    filter: Literal["requirement_6", "requirement_7"],
+) -> int:
+    """
+    requirement_5 采集的电影页面上没有演职员链接（cast_details_url 为空）或没有获奖情况
+    （awards_url 为空）时，对应任务无需请求，直接标记完成。
+    只信任解析出标题的电影行，页面没有真正解析（登录页、异常页面）时链接为空不能说明没有该部分。
+    """
+    url_column = {
+        "requirement_6": models.Movie.cast_details_url,
+        "requirement_7": models.Movie.awards_url,
+    }[filter]
+    prefix = "https://movie.douban.com/subject/"
+    # subject_url 形如 https://movie.douban.com/subject/<id>/，取出其中的 id
+    subject_id = func.rtrim(func.substr(models.Movie.subject_url, len(prefix) + 1), "/")
+    empty_ids = select(subject_id).where(
+        models.Movie.subject_url.startswith(prefix),
+        models.Movie.title.isnot(None),
+        url_column.is_(None),
+    )
+    return _mark_empty(
+        db,
+        models.SubjectMarking,
+        models.SubjectMarking.douban_subject_id,
+        filter,
+        empty_ids,
+    )
+
+
+def _finish(db: Session, model, key_column, task, filter: str) -> bool:
+    """
+    仅当任务仍由本次领取者持有时标记完成（不提交），返回是否成功。
+    调用方在同一事务中写入采集结果后再提交，租约过期被他人领走时放弃写入，
+    避免重复的结果行。
+    """
+    claimed_by_column = getattr(model, f"{filter}_claimed_by")
+    updated = (
+        db.query(model)
+        .filter(
+            key_column == getattr(task, key_column.key),
+            claimed_by_column == getattr(task, f"{filter}_claimed_by"),
+            getattr(model, filter) == false(),
+        )
+        .update(
+            {getattr(model, filter): True, f"{filter}_lease_expires_at": None},
+            synchronize_session=False,
+        )
+    )
+    return updated == 1
+
+
+def finish_marking(
+    db: Session,
+    task: models.Marking,
+    filter: Literal[
+        "requirement_1",
+        "requirement_2",
+        "requirement_3",
+        "requirement_4",
+    ],
+) -> bool:
+    return _finish(db, models.Marking, models.Marking.douban_person_id, task, filter)
+
+
+def finish_subject_marking(
+    db: Session,
+    task: models.SubjectMarking,
+    filter: Literal[
+        "requirement_5",
+        "requirement_6",
+        "requirement_7",
+    ],
+) -> bool:
+    return _finish(
+        db, models.SubjectMarking, models.SubjectMarking.douban_subject_id, task, filter
+    )
+
+
+def _release(db: Session, model, key_column, task, filter: str, commit: bool = True):
+    """任务失败时释放租约，使其可以立即被重新领取"""
+    claimed_by_column = getattr(model, f"{filter}_claimed_by")
+    db.query(model).filter(
+        key_column == getattr(task, key_column.key),
+        claimed_by_column == getattr(task, f"{filter}_claimed_by"),
+    ).update(
+        {claimed_by_column: None, f"{filter}_lease_expires_at": None},
+        synchronize_session=False,
+    )
+    if commit:
+        db.commit()
+
+
+def release_marking(
+    db: Session,
+    task: models.Marking,
+    filter: Literal[
+        "requirement_1",
+        "requirement_2",
+        "requirement_3",
+        "requirement_4",
+    ],
+    commit: bool = True,
+):
+    _release(db, models.Marking, models.Marking.douban_person_id, task, filter, commit)
+
+
+def release_subject_marking(
+    db: Session,
+    task: models.SubjectMarking,
+    filter: Literal[
+        "requirement_5",
+        "requirement_6",
+        "requirement_7",
+    ],
+    commit: bool = True,
+):
+    _release(
+        db,
+        models.SubjectMarking,
+        models.SubjectMarking.douban_subject_id,
+        task,
+        filter,
+        commit,
+    )
+
+
+def _renew(
+    db: Session,
+    model,
+    key_column,
+    tasks: Sequence[Any],
+    filter: str,
+    lease_expires_at: datetime,
+    commit: bool = True,
+) -> int:
+    """
+    延长仍由本次领取者持有的任务的租约，返回续租成功的任务数。
+    执行中和等待重试的任务定期调用，避免任务完成前租约过期、被他人重复领取。
+    """
+    claimed_by_column = getattr(model, f"{filter}_claimed_by")
+    renewed = 0
+    for task in tasks:
+        renewed += (
+            db.query(model)
+            .filter(
+                key_column == getattr(task, key_column.key),
+                claimed_by_column == getattr(task, f"{filter}_claimed_by"),
+                getattr(model, filter) == false(),
+            )
+            .update(
+                {f"{filter}_lease_expires_at": lease_expires_at},
+                synchronize_session=False,
+            )
+        )
+    if commit:
+        db.commit()
+    return renewed
+
+
+def renew_marking_leases(
+    db: Session,
+    tasks: Sequence[models.Marking],
+    filter: Literal[
+        "requirement_1",
+        "requirement_2",
+        "requirement_3",
+        "requirement_4",
+    ],
+    lease_expires_at: datetime,
+    commit: bool = True,
+) -> int:
+    return _renew(
+        db,
+        models.Marking,
+        models.Marking.douban_person_id,
+        tasks,
+        filter,
+        lease_expires_at,
+        commit,
+    )
+
+
+def renew_subject_marking_leases(
+    db: Session,
+    tasks: Sequence[models.SubjectMarking],
+    filter: Literal[
+        "requirement_5",
+        "requirement_6",
+        "requirement_7",
+    ],
+    lease_expires_at: datetime,
+    commit: bool = True,
+) -> int:
+    return _renew(
+        db,
+        models.SubjectMarking,
+        models.SubjectMarking.douban_subject_id,
+        tasks,
+        filter,
+        lease_expires_at,
+        commit,
+    )
+
+
+def adopt_claim(task, claimed, filter: str):
+    """
+    租约过期后本进程又领取到了仍在执行的任务：让执行中的任务改用新的领取标记，
+    完成时租约仍属于自己，不必重复执行。
+    """
+    claimed_by = f"{filter}_claimed_by"
+    setattr(task, claimed_by, getattr(claimed, claimed_by))
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """第 attempts 次失败后到下一次领取的等待时间"""
+    return timedelta(
+        seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+    )
+
+
+def _fail(
+    db: Session,
+    model,
+    key_column,
+    task,
+    filter: str,
+    error: str,
+    permanent: bool = False,
+    commit: bool = True,
+):
+    """
+    记录一次失败并释放租约：失败次数加 1，写入错误类型，按指数退避设置下一次可领取的时间。
+    permanent 为 True（例如 404）或失败次数达到 MAX_ATTEMPTS 时转为死信，不再领取。
+    """
+    claimed_by_column = getattr(model, f"{filter}_claimed_by")
+    # 租约期间只有本领取者会修改失败次数，领取时读到的值就是当前值
+    attempts = (getattr(task, f"{filter}_attempts") or 0) + 1
+    dead = permanent or attempts >= MAX_ATTEMPTS
+    db.query(model).filter(
+        key_column == getattr(task, key_column.key),
+        claimed_by_column == getattr(task, f"{filter}_claimed_by"),
+    ).update(
+        {
+            claimed_by_column: None,
+            f"{filter}_lease_expires_at": None,
+            f"{filter}_attempts": attempts,
+            f"{filter}_last_error": error[:200],
+            f"{filter}_next_eligible_at": (
+                None if dead else datetime.now() + retry_delay(attempts)
+            ),
+            f"{filter}_dead": dead,
+        },
+        synchronize_session=False,
+    )
+    if commit:
+        db.commit()
+
+
+def fail_marking(
+    db: Session,
+    task: models.Marking,
+    filter: Literal[
+        "requirement_1",
+        "requirement_2",
+        "requirement_3",
+        "requirement_4",
+    ],
+    error: str,
+    permanent: bool = False,
+    commit: bool = True,
+):
+    _fail(
+        db,
+        models.Marking,
+        models.Marking.douban_person_id,
+        task,
+        filter,
+        error,
+        permanent,
+        commit,
+    )
+
+
+def fail_subject_marking(
+    db: Session,
+    task: models.SubjectMarking,
+    filter: Literal[
+        "requirement_5",
+        "requirement_6",
+        "requirement_7",
+    ],
+    error: str,
+    permanent: bool = False,
+    commit: bool = True,
+):
+    _fail(
+        db,
+        models.SubjectMarking,
+        models.SubjectMarking.douban_subject_id,
+        task,
+        filter,
+        error,
+        permanent,
+        commit,
+    )
+
+
+def save_marking_result(
+    db: Session,
+    task: models.Marking,
+    filter: Literal[
+        "requirement_1",
+        "requirement_2",
+        "requirement_3",
+        "requirement_4",
+    ],
+    create: Callable[..., Any],
+    data,
+) -> bool:
+    """标记任务完成并写入采集结果（不提交），租约已被他人领走时什么都不写，返回 False"""
+    if not finish_marking(db, task, filter):
+        return False
+    create(db, data, commit=False)
+    return True
+
+
+def save_subject_marking_result(
+    db: Session,
+    task: models.SubjectMarking,
+    filter: Literal[
+        "requirement_5",
+        "requirement_6",
+        "requirement_7",
+    ],
+    create: Callable[..., Any],
+    data,
+) -> bool:
+    if not finish_subject_marking(db, task, filter):
+        return False
+    create(db, data, commit=False)
+    return True
@@ -1,19 +1,73 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-
+from sqlalchemy.pool import QueuePool, StaticPool
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./douban.db"
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False},  # SQLite 特有的参数，允许多线程访问
-    pool_size=10,  # 可选项，SQLite 不支持连接池，但参数不会影响执行
-    max_overflow=20,
-    pool_timeout=30,
-    pool_recycle=3600,
-    pool_pre_ping=True,
-    echo=False,
-)
+# SQLite 连接建立时执行的 PRAGMA
+SQLITE_PRAGMAS = {
+    # WAL 模式下读写互不阻塞，提交只追加写 WAL 文件
+    "journal_mode": "WAL",
+    # WAL 模式下 NORMAL 只在检查点时 fsync，断电最多丢失最近的事务，不会损坏数据库
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    # 负数表示以 KiB 为单位，即 64MB
+    "cache_size": -64 * 1024,
+    # 数据库被锁时等待的毫秒数，而不是立即报 database is locked
+    "busy_timeout": 30000,
+    "temp_store": "MEMORY",
+}
+
+
+def _set_sqlite_pragmas(pragmas: dict):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return on_connect
+
+
+def create_db_engine(
+    url: str = SQLALCHEMY_DATABASE_URL,
+    pragmas: dict | None = SQLITE_PRAGMAS,
+    pool_size: int = 10,
+    max_overflow: int = 20,
+    echo: bool = False,
+):
+    """
+    创建数据库引擎。SQLite 下每个连接建立时执行 pragmas，
+    文件数据库使用 QueuePool 让各线程持有自己的连接，内存数据库只能共享一个连接，使用 StaticPool。
+    """
+    if not url.startswith("sqlite"):
+        return create_engine(
+            url,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_pre_ping=True,
+            echo=echo,
+        )
+    connect_args = {"check_same_thread": False}  # SQLite 特有的参数，允许多线程访问
+    if url in ("sqlite://", "sqlite:///:memory:"):
+        engine = create_engine(
+            url, connect_args=connect_args, poolclass=StaticPool, echo=echo
+        )
+    else:
+        engine = create_engine(
+            url,
+            connect_args=connect_args,
+            poolclass=QueuePool,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            echo=echo,
+        )
+    if pragmas:
+        event.listen(engine, "connect", _set_sqlite_pragmas(pragmas))
+    return engine
+
+
+engine = create_db_engine()
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
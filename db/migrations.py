@@ -0,0 +1,37 @@
+from sqlalchemy import Engine, MetaData, inspect, text
+from sqlalchemy.schema import CreateColumn
+
+
+def upgrade(engine: Engine, metadata: MetaData):
+    """
+    为已存在的数据库补齐模型中新增的列和索引。
+    create_all 只会创建缺失的表，旧表上新增的列需要在这里 ALTER TABLE。
+    列的 info["backfill"] 为补齐已有行时使用的 SQL 表达式；
+    索引的 info["replaces"] 为它取代的旧索引名，按名称判断是否存在的索引改了定义时需要换名，
+    旧索引在这里删除。
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column_ddl}"))
+                if "backfill" in column.info:
+                    conn.execute(
+                        text(
+                            f"UPDATE {table.name} SET {column.name} = {column.info['backfill']}"
+                        )
+                    )
+            existing_indexes = {
+                index["name"] for index in inspector.get_indexes(table.name)
+            }
+            for index in table.indexes:
+                replaces = index.info.get("replaces")
+                if replaces in existing_indexes:
+                    conn.execute(text(f"DROP INDEX {replaces}"))
+                index.create(conn, checkfirst=True)
@@ -1,19 +1,31 @@
+import random
 from sqlalchemy import (
     JSON,
     TEXT,
     Column,
     DateTime,
+    Index,
     Integer,
     String,
     Boolean,
+    and_,
+    false,
     func,
 )
 from sqlalchemy.ext.declarative import declarative_base
 from typing import Optional
 from db.database import engine
+from db.migrations import upgrade
 
 Base = declarative_base()
 
+# 随机分片键的取值范围
+RAND_KEY_SPACE = 2**31
+
+
+def random_key() -> int:
+    return random.randrange(RAND_KEY_SPACE)
+
 
 class Marking(Base):
     __tablename__ = "marking"
@@ -31,9 +43,136 @@ class Marking(Base):
     requirement_4 = Column(
         Boolean, nullable=False, default=False, comment="任务4是否完成"
     )
+    requirement_1_claimed_by = Column(String, nullable=True, comment="任务1领取者")
+    requirement_1_lease_expires_at = Column(
+        DateTime, nullable=True, comment="任务1租约到期时间"
+    )
+    requirement_2_claimed_by = Column(String, nullable=True, comment="任务2领取者")
+    requirement_2_lease_expires_at = Column(
+        DateTime, nullable=True, comment="任务2租约到期时间"
+    )
+    requirement_3_claimed_by = Column(String, nullable=True, comment="任务3领取者")
+    requirement_3_lease_expires_at = Column(
+        DateTime, nullable=True, comment="任务3租约到期时间"
+    )
+    requirement_4_claimed_by = Column(String, nullable=True, comment="任务4领取者")
+    requirement_4_lease_expires_at = Column(
+        DateTime, nullable=True, comment="任务4租约到期时间"
+    )
+    requirement_1_attempts = Column(
+        Integer, nullable=False, default=0, server_default="0", comment="任务1失败次数"
+    )
+    requirement_1_last_error = Column(
+        String, nullable=True, comment="任务1最近一次失败的错误类型"
+    )
+    requirement_1_next_eligible_at = Column(
+        DateTime, nullable=True, comment="任务1失败后可再次领取的时间"
+    )
+    requirement_1_dead = Column(
+        Boolean,
+        nullable=False,
+        default=False,
+        server_default=false(),
+        comment="任务1是否已放弃（死信）",
+    )
+    requirement_2_attempts = Column(
+        Integer, nullable=False, default=0, server_default="0", comment="任务2失败次数"
+    )
+    requirement_2_last_error = Column(
+        String, nullable=True, comment="任务2最近一次失败的错误类型"
+    )
+    requirement_2_next_eligible_at = Column(
+        DateTime, nullable=True, comment="任务2失败后可再次领取的时间"
+    )
+    requirement_2_dead = Column(
+        Boolean,
+        nullable=False,
+        default=False,
+        server_default=false(),
+        comment="任务2是否已放弃（死信）",
+    )
+    requirement_3_attempts = Column(
+        Integer, nullable=False, default=0, server_default="0", comment="任务3失败次数"
+    )
+    requirement_3_last_error = Column(
+        String, nullable=True, comment="任务3最近一次失败的错误类型"
+    )
+    requirement_3_next_eligible_at = Column(
+        DateTime, nullable=True, comment="任务3失败后可再次领取的时间"
+    )
+    requirement_3_dead = Column(
+        Boolean,
+        nullable=False,
+        default=False,
+        server_default=false(),
+        comment="任务3是否已放弃（死信）",
+    )
+    requirement_4_attempts = Column(
+        Integer, nullable=False, default=0, server_default="0", comment="任务4失败次数"
+    )
+    requirement_4_last_error = Column(
+        String, nullable=True, comment="任务4最近一次失败的错误类型"
+    )
+    requirement_4_next_eligible_at = Column(
+        DateTime, nullable=True, comment="任务4失败后可再次领取的时间"
+    )
+    requirement_4_dead = Column(
+        Boolean,
+        nullable=False,
+        default=False,
+        server_default=false(),
+        comment="任务4是否已放弃（死信）",
+    )
+    rand_key = Column(
+        Integer,
+        nullable=True,
+        default=random_key,
+        info={"backfill": f"abs(random()) % {RAND_KEY_SPACE}"},
+        comment="随机分片键",
+    )
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
+    # 每个任务一个只包含未完成且未转为死信的行的部分索引，按 rand_key 取任务无需排序全表
+    __table_args__ = (
+        Index(
+            "ix_marking_requirement_1_claimable",
+            rand_key,
+            sqlite_where=and_(requirement_1 == false(), requirement_1_dead == false()),
+            postgresql_where=and_(
+                requirement_1 == false(), requirement_1_dead == false()
+            ),
+            info={"replaces": "ix_marking_requirement_1_pending"},
+        ),
+        Index(
+            "ix_marking_requirement_2_claimable",
+            rand_key,
+            sqlite_where=and_(requirement_2 == false(), requirement_2_dead == false()),
+            postgresql_where=and_(
+                requirement_2 == false(), requirement_2_dead == false()
+            ),
+            info={"replaces": "ix_marking_requirement_2_pending"},
+        ),
+        Index(
+            "ix_marking_requirement_3_claimable",
+            rand_key,
+            sqlite_where=and_(requirement_3 == false(), requirement_3_dead == false()),
+            postgresql_where=and_(
+                requirement_3 == false(), requirement_3_dead == false()
+            ),
+            info={"replaces": "ix_marking_requirement_3_pending"},
+        ),
+        Index(
+            "ix_marking_requirement_4_claimable",
+            rand_key,
+            sqlite_where=and_(requirement_4 == false(), requirement_4_dead == false()),
+            postgresql_where=and_(
+                requirement_4 == false(), requirement_4_dead == false()
+            ),
+            info={"replaces": "ix_marking_requirement_4_pending"},
+        ),
+    )
+
 
 class SubjectMarking(Base):
     __tablename__ = "subject_marking"
@@ -48,9 +187,108 @@ class SubjectMarking(Base):
     requirement_7 = Column(
         Boolean, nullable=False, default=False, comment="任务7是否完成"
     )
+    requirement_5_claimed_by = Column(String, nullable=True, comment="任务5领取者")
+    requirement_5_lease_expires_at = Column(
+        DateTime, nullable=True, comment="任务5租约到期时间"
+    )
+    requirement_6_claimed_by = Column(String, nullable=True, comment="任务6领取者")
+    requirement_6_lease_expires_at = Column(
+        DateTime, nullable=True, comment="任务6租约到期时间"
+    )
+    requirement_7_claimed_by = Column(String, nullable=True, comment="任务7领取者")
+    requirement_7_lease_expires_at = Column(
+        DateTime, nullable=True, comment="任务7租约到期时间"
+    )
+    requirement_5_attempts = Column(
+        Integer, nullable=False, default=0, server_default="0", comment="任务5失败次数"
+    )
+    requirement_5_last_error = Column(
+        String, nullable=True, comment="任务5最近一次失败的错误类型"
+    )
+    requirement_5_next_eligible_at = Column(
+        DateTime, nullable=True, comment="任务5失败后可再次领取的时间"
+    )
+    requirement_5_dead = Column(
+        Boolean,
+        nullable=False,
+        default=False,
+        server_default=false(),
+        comment="任务5是否已放弃（死信）",
+    )
+    requirement_6_attempts = Column(
+        Integer, nullable=False, default=0, server_default="0", comment="任务6失败次数"
+    )
+    requirement_6_last_error = Column(
+        String, nullable=True, comment="任务6最近一次失败的错误类型"
+    )
+    requirement_6_next_eligible_at = Column(
+        DateTime, nullable=True, comment="任务6失败后可再次领取的时间"
+    )
+    requirement_6_dead = Column(
+        Boolean,
+        nullable=False,
+        default=False,
+        server_default=false(),
+        comment="任务6是否已放弃（死信）",
+    )
+    requirement_7_attempts = Column(
+        Integer, nullable=False, default=0, server_default="0", comment="任务7失败次数"
+    )
+    requirement_7_last_error = Column(
+        String, nullable=True, comment="任务7最近一次失败的错误类型"
+    )
+    requirement_7_next_eligible_at = Column(
+        DateTime, nullable=True, comment="任务7失败后可再次领取的时间"
+    )
+    requirement_7_dead = Column(
+        Boolean,
+        nullable=False,
+        default=False,
+        server_default=false(),
+        comment="任务7是否已放弃（死信）",
+    )
+    rand_key = Column(
+        Integer,
+        nullable=True,
+        default=random_key,
+        info={"backfill": f"abs(random()) % {RAND_KEY_SPACE}"},
+        comment="随机分片键",
+    )
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
+    __table_args__ = (
+        Index(
+            "ix_subject_marking_requirement_5_claimable",
+            rand_key,
+            sqlite_where=and_(requirement_5 == false(), requirement_5_dead == false()),
+            postgresql_where=and_(
+                requirement_5 == false(), requirement_5_dead == false()
+            ),
+            info={"replaces": "ix_subject_marking_requirement_5_pending"},
+        ),
+        Index(
+            "ix_subject_marking_requirement_6_claimable",
+            type,
+            rand_key,
+            sqlite_where=and_(requirement_6 == false(), requirement_6_dead == false()),
+            postgresql_where=and_(
+                requirement_6 == false(), requirement_6_dead == false()
+            ),
+            info={"replaces": "ix_subject_marking_requirement_6_pending"},
+        ),
+        Index(
+            "ix_subject_marking_requirement_7_claimable",
+            type,
+            rand_key,
+            sqlite_where=and_(requirement_7 == false(), requirement_7_dead == false()),
+            postgresql_where=and_(
+                requirement_7 == false(), requirement_7_dead == false()
+            ),
+            info={"replaces": "ix_subject_marking_requirement_7_pending"},
+        ),
+    )
+
 
 class DoubanPerson(Base):
     __tablename__ = "douban_person"
@@ -301,3 +539,5 @@ class Cast(Base):
 
 # 创建表
 Base.metadata.create_all(engine)
+# 为旧数据库补齐新增的列和索引
+upgrade(engine, Base.metadata)
@@ -0,0 +1,149 @@
+import logging
+import queue
+import threading
+import time
+from typing import Callable, NamedTuple, Optional
+
+from sqlalchemy.orm import Session
+
+from db import database
+
+_STOP = object()
+
+
+class WriteOp(NamedTuple):
+    # 日志中使用的标识，一般为任务 id
+    name: str
+    # 在写线程的 session 中执行，不提交；返回 False 表示租约已丢失、没有写入
+    write: Callable[[Session], Optional[bool]]
+    # 单条写入失败时在回滚后执行，例如释放租约
+    on_error: Optional[Callable[[Session], None]] = None
+
+
+class DBWriter:
+    """
+    独立的数据库写线程。
+    采集线程只把写操作放进队列，写线程按条数或时间攒批，
+    在一个事务中提交整批结果和对应的任务状态，提交次数不再限制采集吞吐。
+    整批失败时回滚，再逐条重试，单条的错误不会影响同批的其他结果。
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = database.SessionLocal,
+        batch_size: int = 200,
+        flush_seconds: float = 1,
+        queue_size: int = 10000,
+    ):
+        """
+        :param session_factory: 写线程使用的 session 工厂
+        :param batch_size: 每批最多写入的操作数
+        :param flush_seconds: 攒批的最长等待时间
+        :param queue_size: 队列容量，写入跟不上时 submit 会阻塞
+        """
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.written = 0
+        self.failed = 0
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+        return self
+
+    def submit(
+        self,
+        name: str,
+        write: Callable[[Session], Optional[bool]],
+        on_error: Optional[Callable[[Session], None]] = None,
+    ):
+        self.queue.put(WriteOp(name, write, on_error))
+
+    def close(self):
+        """写完队列中剩余的操作后退出"""
+        if self._thread is None:
+            return
+        self.queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+        logging.info(
+            f"DB writer finished: {self.written} written, {self.failed} failed"
+        )
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _next_batch(self) -> tuple[list[WriteOp], bool]:
+        op = self.queue.get()
+        if op is _STOP:
+            return [], True
+        batch = [op]
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                op = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if op is _STOP:
+                return batch, True
+            batch.append(op)
+        return batch, False
+
+    def _run(self):
+        db = self.session_factory()
+        try:
+            stopping = False
+            while not stopping:
+                batch, stopping = self._next_batch()
+                if batch:
+                    self._flush(db, batch)
+        finally:
+            db.close()
+
+    def _flush(self, db: Session, batch: list[WriteOp]):
+        try:
+            results = [op.write(db) for op in batch]
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logging.warning(
+                f"Batch write of {len(batch)} items failed, retrying one by one: {e}"
+            )
+            for op in batch:
+                self._flush_one(db, op)
+            return
+        for op, result in zip(batch, results):
+            self._done(op, result)
+
+    def _flush_one(self, db: Session, op: WriteOp):
+        try:
+            result = op.write(db)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            self.failed += 1
+            logging.error(f"Error occurred while writing [{op.name}]: {e}")
+            if op.on_error is not None:
+                try:
+                    op.on_error(db)
+                    db.commit()
+                except Exception as e:
+                    db.rollback()
+                    logging.error(f"Error occurred while recovering [{op.name}]: {e}")
+            return
+        self._done(op, result)
+
+    def _done(self, op: WriteOp, result: Optional[bool]):
+        if result is False:
+            logging.warning(f"[{op.name}] Lease lost, skipping")
+        else:
+            self.written += 1
@@ -0,0 +1,309 @@
+import hashlib
+import os
+import random
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Iterator, NamedTuple, Optional
+
+try:
+    import zstandard
+except ImportError:  # 未安装 zstandard 时退回 zlib
+    zstandard = None
+
+# 默认的归档目录
+ARCHIVE_DIR = "./archive"
+# zstd 压缩级别
+ZSTD_LEVEL = 10
+# 训练字典时的默认样本数和字典大小
+DICT_SAMPLES = 2000
+DICT_SIZE = 112 * 1024
+# 当前字典 id 的缓存秒数，其他进程训练的新字典最迟这么久后开始使用
+DICT_REFRESH_SECONDS = 300
+
+
+class ArchivedPage(NamedTuple):
+    url: str
+    fetched_at: float
+    sha256: str
+    status: int
+    body: bytes
+
+    @property
+    def text(self) -> str:
+        return self.body.decode("utf-8", errors="replace")
+
+
+class Validators(NamedTuple):
+    """条件请求使用的响应头和对应正文"""
+
+    etag: Optional[str]
+    last_modified: Optional[str]
+    sha256: str
+    validated_at: float
+
+
+class PageArchive:
+    """
+    原始页面归档。
+    每次抓取按 (url, 抓取时间) 记录到 SQLite 索引，正文按 sha256 去重后压缩存成单独的文件，
+    内容相同的页面只存一份。训练过字典后，新写入的正文使用 zstd 字典压缩。
+    """
+
+    def __init__(self, root: str = ARCHIVE_DIR, level: int = ZSTD_LEVEL):
+        self.root = root
+        self.level = level
+        os.makedirs(os.path.join(root, "blobs"), exist_ok=True)
+        os.makedirs(os.path.join(root, "dicts"), exist_ok=True)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._dicts: dict[int, "zstandard.ZstdCompressionDict"] = {}
+        # (字典 id, 查询时间)
+        self._dict_id: Optional[tuple[Optional[int], float]] = None
+        db = self._db()
+        db.executescript("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                sha256 TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                PRIMARY KEY (url, fetched_at)
+            );
+            CREATE TABLE IF NOT EXISTS blobs (
+                sha256 TEXT PRIMARY KEY,
+                codec TEXT NOT NULL,
+                dict_id INTEGER,
+                size INTEGER NOT NULL,
+                stored_size INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS dicts (
+                dict_id INTEGER PRIMARY KEY,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS validators (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                sha256 TEXT NOT NULL,
+                validated_at REAL NOT NULL
+            );
+            """)
+        db.commit()
+
+    def _db(self) -> sqlite3.Connection:
+        """每个线程使用自己的连接"""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(os.path.join(self.root, "index.db"), timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _blob_path(self, sha256: str) -> str:
+        return os.path.join(self.root, "blobs", sha256[:2], sha256[2:4], sha256)
+
+    def _dict(self, dict_id: int):
+        if dict_id not in self._dicts:
+            with open(os.path.join(self.root, "dicts", f"{dict_id}.dict"), "rb") as f:
+                self._dicts[dict_id] = zstandard.ZstdCompressionDict(f.read())
+        return self._dicts[dict_id]
+
+    def _current_dict_id(self) -> Optional[int]:
+        cached = self._dict_id
+        if cached is not None and time.monotonic() - cached[1] < DICT_REFRESH_SECONDS:
+            return cached[0]
+        row = (
+            self._db()
+            .execute("SELECT dict_id FROM dicts ORDER BY created_at DESC LIMIT 1")
+            .fetchone()
+        )
+        dict_id = row[0] if row else None
+        self._dict_id = (dict_id, time.monotonic())
+        return dict_id
+
+    def _compress(self, body: bytes) -> tuple[str, Optional[int], bytes]:
+        if zstandard is None:
+            return "zlib", None, zlib.compress(body, 6)
+        dict_id = self._current_dict_id()
+        if dict_id is None:
+            compressor = zstandard.ZstdCompressor(level=self.level)
+        else:
+            compressor = zstandard.ZstdCompressor(
+                level=self.level, dict_data=self._dict(dict_id)
+            )
+        return "zstd", dict_id, compressor.compress(body)
+
+    def _decompress(self, codec: str, dict_id: Optional[int], data: bytes) -> bytes:
+        if codec == "zlib":
+            return zlib.decompress(data)
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd blobs.")
+        if dict_id is None:
+            return zstandard.ZstdDecompressor().decompress(data)
+        return zstandard.ZstdDecompressor(dict_data=self._dict(dict_id)).decompress(
+            data
+        )
+
+    def put(
+        self,
+        url: str,
+        body: bytes,
+        status: int = 200,
+        fetched_at: Optional[float] = None,
+    ) -> str:
+        """
+        归档一次抓取，返回正文的 sha256。
+        哈希、压缩和写临时文件都在锁外进行，锁内只写索引并把临时文件改名为正式文件。
+        """
+        sha256 = hashlib.sha256(body).hexdigest()
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        blob = None
+        if not self.has_blob(sha256):
+            codec, dict_id, data = self._compress(body)
+            path = self._blob_path(sha256)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 先写临时文件再改名，避免中断时留下残缺的正文
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            blob = (codec, dict_id, len(data), path, tmp_path)
+        db = self._db()
+        with self._lock:
+            if blob is not None:
+                codec, dict_id, stored_size, path, tmp_path = blob
+                inserted = db.execute(
+                    "INSERT OR IGNORE INTO blobs VALUES (?, ?, ?, ?, ?)",
+                    (sha256, codec, dict_id, len(body), stored_size),
+                ).rowcount
+                # 同时写入同一正文时只保留索引对应的那份，压缩参数不同的文件不能覆盖它
+                if inserted:
+                    os.replace(tmp_path, path)
+                else:
+                    os.remove(tmp_path)
+            db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)",
+                (url, fetched_at, sha256, status),
+            )
+            db.commit()
+        return sha256
+
+    def has_blob(self, sha256: str) -> bool:
+        row = (
+            self._db()
+            .execute("SELECT 1 FROM blobs WHERE sha256 = ?", (sha256,))
+            .fetchone()
+        )
+        return row is not None
+
+    def get_blob(self, sha256: str) -> bytes:
+        row = (
+            self._db()
+            .execute("SELECT codec, dict_id FROM blobs WHERE sha256 = ?", (sha256,))
+            .fetchone()
+        )
+        if row is None:
+            raise KeyError(sha256)
+        with open(self._blob_path(sha256), "rb") as f:
+            return self._decompress(row[0], row[1], f.read())
+
+    def latest(self, url: str) -> Optional[ArchivedPage]:
+        """返回 url 最近一次的抓取，没有归档时返回 None"""
+        row = (
+            self._db()
+            .execute(
+                "SELECT url, fetched_at, sha256, status FROM pages WHERE url = ? "
+                "ORDER BY fetched_at DESC LIMIT 1",
+                (url,),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        return ArchivedPage(*row, self.get_blob(row[2]))
+
+    def history(self, url: str) -> list[tuple[float, str, int]]:
+        """返回 url 的所有抓取记录 (抓取时间, sha256, 状态码)"""
+        return (
+            self._db()
+            .execute(
+                "SELECT fetched_at, sha256, status FROM pages WHERE url = ? "
+                "ORDER BY fetched_at",
+                (url,),
+            )
+            .fetchall()
+        )
+
+    def iter_latest(self, url_like: str = "%") -> Iterator[tuple[str, float, str]]:
+        """遍历匹配 url_like 的每个 url 最近一次抓取的 (url, 抓取时间, sha256)，不读取正文"""
+        cursor = self._db().execute(
+            "SELECT url, MAX(fetched_at), sha256 FROM pages "
+            "WHERE url LIKE ? AND status = 200 GROUP BY url ORDER BY url",
+            (url_like,),
+        )
+        yield from cursor
+
+    def validators(self, url: str) -> Optional[Validators]:
+        """url 最近一次验证过的 ETag、Last-Modified 和正文 sha256，没有时返回 None"""
+        row = (
+            self._db()
+            .execute(
+                "SELECT etag, last_modified, sha256, validated_at FROM validators "
+                "WHERE url = ?",
+                (url,),
+            )
+            .fetchone()
+        )
+        return Validators(*row) if row else None
+
+    def put_validators(
+        self,
+        url: str,
+        etag: Optional[str],
+        last_modified: Optional[str],
+        sha256: str,
+        validated_at: Optional[float] = None,
+    ):
+        validated_at = time.time() if validated_at is None else validated_at
+        db = self._db()
+        with self._lock:
+            db.execute(
+                "INSERT OR REPLACE INTO validators VALUES (?, ?, ?, ?, ?)",
+                (url, etag, last_modified, sha256, validated_at),
+            )
+            db.commit()
+
+    def train_dictionary(
+        self, samples: int = DICT_SAMPLES, dict_size: int = DICT_SIZE
+    ) -> int:
+        """
+        用已归档的正文训练 zstd 字典，之后写入的正文使用该字典压缩。
+        豆瓣页面的模板高度重复，字典能显著提高小页面的压缩率。返回字典 id。
+        """
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to train a dictionary.")
+        shas = [
+            row[0] for row in self._db().execute("SELECT sha256 FROM blobs").fetchall()
+        ]
+        shas = random.sample(shas, min(samples, len(shas)))
+        dictionary = zstandard.train_dictionary(
+            dict_size, [self.get_blob(sha) for sha in shas]
+        )
+        dict_id = dictionary.dict_id()
+        with open(os.path.join(self.root, "dicts", f"{dict_id}.dict"), "wb") as f:
+            f.write(dictionary.as_bytes())
+        db = self._db()
+        with self._lock:
+            db.execute(
+                "INSERT OR REPLACE INTO dicts VALUES (?, ?)", (dict_id, time.time())
+            )
+            db.commit()
+        self._dict_id = (dict_id, time.monotonic())
+        return dict_id
+
+    def close(self):
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+            self._local.db = None
@@ -0,0 +1,716 @@
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Any, Awaitable, Callable, Literal, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+from sqlalchemy.orm import Session
+
+from circuit_breaker import (
+    CircuitBreakers,
+    CircuitOpenError,
+    RetryBudget,
+    error_name,
+    is_permanent,
+)
+from cookies_manager import (
+    COOKIE_MAX_WAIT_SECONDS,
+    CookiePool,
+    CookieUnavailableError,
+)
+from db import crud, database
+from db.schemas import BookCreate, MovieCreate, MusicCreate
+from db.writer import DBWriter
+from douban.archive import ARCHIVE_DIR, PageArchive
+from rate_limiter import DEFAULT_HOST_RATE, HostRateLimiter
+from douban.client import HEADERS, TIMEOUT, create_limiter, request_url
+from douban.http_cache import HttpCache
+from douban.parse_pool import PARSE_WORKERS, ParsePool
+from douban.partners import archived_first_page, observe_page, page_size
+from douban.requirement_1 import DoubanPersonScraper
+from douban.requirement_2 import WORK_TYPES, DoubanWorkScraper, WorkType
+from douban.requirement_3 import DoubanAwardScraper
+from douban.requirement_4 import DoubanCollaborationScraper
+from douban.requirement_5 import DoubanSubjectScraper
+from douban.requirement_6 import DoubanCastScraper
+from douban.requirement_7 import DoubanSubjectAwardScraper
+
+Requirement = Literal[
+    "requirement_1",
+    "requirement_2",
+    "requirement_3",
+    "requirement_4",
+    "requirement_5",
+    "requirement_6",
+    "requirement_7",
+]
+
+
+class AsyncDoubanClient:
+    """
+    基于 aiohttp 的异步客户端，每个 host 用一个信号量限制在途请求数。
+    配置了 breakers 时，熔断中的接口直接抛出 CircuitOpenError，不再重试。
+    只重试连接失败、超时和 5xx，每次重试从共享的 retry_budget 中扣除；4xx 直接抛出，交给调用方放弃任务。
+    配置了 cache 时，缓存期内的页面直接由归档返回，过期的页面发条件请求。
+    """
+
+    def __init__(
+        self,
+        proxy_url: Optional[str] = None,
+        per_host_limit: int = 200,
+        timeout: float = TIMEOUT,
+        tries: int = 3,
+        delay: float = 2,
+        backoff: float = 2,
+        archive: Optional[PageArchive] = None,
+        limiter: Optional[HostRateLimiter] = None,
+        breakers: Optional[CircuitBreakers] = None,
+        cache: Optional[HttpCache] = None,
+        retry_budget: Optional[RetryBudget] = None,
+    ):
+        self.proxy_url = proxy_url
+        self.archive = archive
+        self.limiter = limiter
+        self.breakers = breakers
+        self.cache = cache
+        self.retry_budget = retry_budget or RetryBudget()
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.tries = tries
+        self.delay = delay
+        self.backoff = backoff
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._semaphores: dict[str, asyncio.Semaphore] = defaultdict(
+            lambda: asyncio.Semaphore(self.per_host_limit)
+        )
+
+    async def __aenter__(self):
+        # 并发上限交给每个 host 的信号量控制，连接器本身不再限制
+        connector = aiohttp.TCPConnector(limit=0, ttl_dns_cache=300)
+        self.session = aiohttp.ClientSession(
+            headers=HEADERS,
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if self.session is not None:
+            await self.session.close()
+
+    async def _request(
+        self,
+        url: str,
+        params: Optional[dict[str, Any]],
+        cookies: Optional[dict[str, str]],
+        as_json: bool,
+    ) -> Any:
+        assert self.session is not None, "AsyncDoubanClient 需要在 async with 中使用"
+        host = urlsplit(url).hostname or ""
+        semaphore = self._semaphores[host]
+        delay = self.delay
+        cache_key = None
+        headers: dict[str, str] = {}
+        if self.cache is not None:
+            cache_key = request_url(url, params)
+            body = await asyncio.to_thread(self.cache.fresh_body, cache_key)
+            if body is not None:
+                text = body.decode("utf-8")
+                return json.loads(text) if as_json else text
+            headers = await asyncio.to_thread(self.cache.conditional_headers, cache_key)
+        for attempt in range(self.tries):
+            if self.breakers is not None:
+                self.breakers.before(url)
+            status = None
+            try:
+                if self.limiter is not None:
+                    # 取令牌是一次 SQLite 写事务，放到线程中执行，等待不阻塞事件循环
+                    wait = await asyncio.to_thread(self.limiter.reserve, host)
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                async with semaphore:
+                    async with self.session.get(
+                        url,
+                        params=params,
+                        cookies=cookies,
+                        proxy=self.proxy_url,
+                        headers=headers,
+                    ) as response:
+                        status = response.status
+                        response.raise_for_status()
+                        body = await response.read()
+                        if cache_key is not None:
+                            if status == 304:
+                                body = await asyncio.to_thread(
+                                    self.cache.not_modified,  # type: ignore
+                                    cache_key,
+                                    response.headers,
+                                )
+                                if body is not None:
+                                    if self.archive is not None:
+                                        await asyncio.to_thread(
+                                            self.archive.put, cache_key, body
+                                        )
+                                    text = body.decode("utf-8")
+                                    return json.loads(text) if as_json else text
+                            elif status == 200 and not response.history:
+                                await asyncio.to_thread(
+                                    self.cache.store,  # type: ignore
+                                    cache_key,
+                                    response.headers,
+                                    body,
+                                )
+                        if self.archive is not None:
+                            archived_url = (
+                                response.history[0].url
+                                if response.history
+                                else response.url
+                            )
+                            await asyncio.to_thread(
+                                self.archive.put,
+                                str(archived_url),
+                                body,
+                                response.status,
+                            )
+                        text = body.decode(response.get_encoding())
+                        return json.loads(text) if as_json else text
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # 4xx（404、登录限制、403/418/429 等）重试也没有用，直接交给调用方放弃或记入死信
+                if isinstance(e, aiohttp.ClientResponseError) and e.status < 500:
+                    raise
+                if attempt == self.tries - 1:
+                    raise
+                if not self.retry_budget.try_spend():
+                    logging.warning(f"Retry budget exhausted, giving up {url}")
+                    raise
+            finally:
+                # status 为 None 表示连接失败或超时
+                if self.breakers is not None:
+                    self.breakers.record(url, status)
+            await asyncio.sleep(delay)
+            delay *= self.backoff
+
+    async def get_text(
+        self,
+        url: str,
+        params: Optional[dict[str, Any]] = None,
+        cookies: Optional[dict[str, str]] = None,
+    ) -> str:
+        return await self._request(url, params, cookies, as_json=False)
+
+    async def get_json(
+        self,
+        url: str,
+        params: Optional[dict[str, Any]] = None,
+        cookies: Optional[dict[str, str]] = None,
+    ) -> Any:
+        return await self._request(url, params, cookies, as_json=True)
+
+
+# 以下抓取函数只负责请求，返回 (采集器, 原始页面)，解析交给解析进程池中的 parse_raw
+
+
+async def _scrape_person(http: AsyncDoubanClient, task_id: str, cookies, type):
+    scraper = DoubanPersonScraper(task_id)
+    raw = await asyncio.gather(
+        http.get_text(scraper.douban_url),
+        http.get_text(scraper.works_count_url),
+        http.get_json(scraper.partners_api_url, scraper.partners_params()),
+    )
+    return scraper, tuple(raw)
+
+
+async def _plan_works(
+    http: AsyncDoubanClient, task_id: str, works_count: Optional[str] = None
+) -> tuple[WorkType, ...]:
+    """与线程模式相同，只请求人物主页和 requirement_1 作品数表明有作品的类型"""
+    douban_url = DoubanWorkScraper(task_id, {}).douban_url
+    person = (
+        await asyncio.to_thread(http.archive.latest, douban_url)
+        if http.archive is not None
+        else None
+    )
+    person_html = person.text if person is not None and person.status == 200 else None
+    return DoubanWorkScraper.plan_types(person_html, works_count)
+
+
+async def _scrape_works(
+    http: AsyncDoubanClient,
+    task_id: str,
+    cookies,
+    type,
+    types: tuple[WorkType, ...] = WORK_TYPES,
+):
+    scraper = DoubanWorkScraper(task_id, cookies)
+    url = scraper.douban_url + "creations"
+    raw = {}
+    for work_type in types:
+        html = await http.get_text(
+            url, scraper.works_page_params(0, work_type), cookies
+        )
+        pages = await asyncio.gather(
+            *[
+                http.get_text(url, scraper.works_page_params(page, work_type), cookies)
+                for page in range(1, scraper.total_pages(html))
+            ]
+        )
+        raw[work_type] = [html, *pages]
+    return scraper, raw
+
+
+async def _scrape_awards(http: AsyncDoubanClient, task_id: str, cookies, type):
+    scraper = DoubanAwardScraper(task_id, cookies=cookies)
+    return scraper, await http.get_text(scraper.star_award_url, cookies=cookies)
+
+
+async def _scrape_collaborations(http: AsyncDoubanClient, task_id: str, cookies, type):
+    scraper = DoubanCollaborationScraper(task_id)
+    # requirement_1 已请求并归档过的第一页直接复用
+    data = await asyncio.to_thread(archived_first_page, http.archive, task_id)
+    if data is None:
+        data = await http.get_json(scraper.partners_api_url, scraper.partners_params())
+    items = list(data.get("items") or [])
+    total = data.get("total", 0)
+    if len(items) >= total:
+        return scraper, items
+    # 先确认接口接受的页大小，再同时请求剩余页
+    count = page_size()
+    data = await http.get_json(
+        scraper.partners_api_url, scraper.partners_params(len(items), count)
+    )
+    page_items = data.get("items") or []
+    observe_page(count, len(page_items), total - len(items))
+    if not page_items:
+        return scraper, items
+    items.extend(page_items)
+    count = page_size()
+    pages = await asyncio.gather(
+        *[
+            http.get_json(
+                scraper.partners_api_url, scraper.partners_params(start, count)
+            )
+            for start in range(len(items), total, count)
+        ]
+    )
+    for page in pages:
+        items.extend(page.get("items") or [])
+    return scraper, items
+
+
+async def _scrape_subject(http: AsyncDoubanClient, task_id: str, cookies, type):
+    scraper = DoubanSubjectScraper(task_id, type)
+    return scraper, await http.get_text(scraper.subject_url)
+
+
+async def _scrape_casts(http: AsyncDoubanClient, task_id: str, cookies, type):
+    scraper = DoubanCastScraper(task_id)
+    return scraper, await http.get_text(scraper.cast_url)
+
+
+async def _scrape_subject_awards(http: AsyncDoubanClient, task_id: str, cookies, type):
+    scraper = DoubanSubjectAwardScraper(task_id)
+    return scraper, await http.get_text(scraper.awards_url)
+
+
+def _save_subject(db: Session, subject, commit: bool = True):
+    create = {
+        MovieCreate: crud.create_movie,
+        BookCreate: crud.create_book,
+        MusicCreate: crud.create_music,
+    }[type(subject)]
+    create(db, subject, commit=commit)
+
+
+# 跳转到登录页时抛出的异常，说明本次使用的 cookie 已失效
+LOGIN_REQUIRED_ERRORS = (
+    DoubanWorkScraper.LoginRequiredError,
+    DoubanAwardScraper.LoginRequiredError,
+)
+
+# 每个任务在同一个 host 上预计发出的请求数（requirement_1 请求两个 www 页面，
+# requirement_2 和 requirement_4 每个列表页一个请求），用于估算一个租约时长内能完成的任务数
+REQUESTS_PER_TASK = {
+    "requirement_1": 2,
+    "requirement_2": 3,
+    "requirement_3": 1,
+    "requirement_4": 2,
+    "requirement_5": 1,
+    "requirement_6": 1,
+    "requirement_7": 1,
+}
+# 为排队和执行中的任务续租的间隔秒数
+HEARTBEAT_SECONDS = 60
+
+# requirement -> (抓取函数, 入库函数, 是否需要登录 cookie)
+HANDLERS: dict[str, tuple[Callable[..., Awaitable[Any]], Callable, bool]] = {
+    "requirement_1": (_scrape_person, crud.create_douban_person, False),
+    "requirement_2": (_scrape_works, crud.create_douban_works_mutil, True),
+    "requirement_3": (_scrape_awards, crud.create_award_info_mutil, True),
+    "requirement_4": (_scrape_collaborations, crud.create_collaborations_mutil, False),
+    "requirement_5": (_scrape_subject, _save_subject, False),
+    "requirement_6": (_scrape_casts, crud.create_casts_mutil, False),
+    "requirement_7": (_scrape_subject_awards, crud.create_subject_awards_mutil, False),
+}
+
+
+class AsyncCrawlEngine:
+    """
+    asyncio 执行模式：一个进程内维持大量在途请求，
+    解析在进程池中进行，不占用事件循环，解析逻辑与线程模式共用各采集器的 parse_raw 方法。
+    """
+
+    def __init__(
+        self,
+        requirement: Requirement,
+        concurrency: int = 1000,
+        per_host_limit: int = 200,
+        proxy_url: Optional[str] = None,
+        cookies_list: Optional[list[dict]] = None,
+        archive_dir: Optional[str] = ARCHIVE_DIR,
+        parse_workers: Optional[int] = PARSE_WORKERS,
+        rate: Optional[float] = None,
+        http_cache: bool = False,
+    ):
+        self.requirement = requirement
+        self.concurrency = concurrency
+        self.per_host_limit = per_host_limit
+        self.proxy_url = proxy_url
+        self.archive = PageArchive(archive_dir) if archive_dir else None
+        # 与线程模式共用限速状态文件，同时运行时合计速率也不超过配置
+        self.limiter = create_limiter(rate)
+        # 在途（含排队）任务数不超过限速下半个租约时长内能完成的任务数，
+        # 排队不会太久；排队和执行中的任务另外定期续租
+        self.max_inflight = max(
+            1,
+            min(
+                concurrency,
+                int(
+                    (rate or DEFAULT_HOST_RATE[0])
+                    * crud.LEASE_SECONDS
+                    * 0.5
+                    / REQUESTS_PER_TASK[requirement]
+                ),
+            ),
+        )
+        # 按接口熔断，上游故障时快速失败并暂停领取任务
+        self.breakers = CircuitBreakers()
+        # 全部请求共用的重试预算，每启动一个任务存入一份
+        self.retry_budget = RetryBudget()
+        # 开启时缓存期内的页面直接由归档返回，过期的页面发条件请求
+        self.cache = HttpCache(self.archive) if http_cache and self.archive else None
+        self.scrape, self.create, need_cookies = HANDLERS[requirement]
+        if need_cookies and not cookies_list:
+            raise ValueError(f"{requirement} requires cookies_list.")
+        # 只有需要登录的任务使用 cookie，与线程模式一致
+        self.cookie_pool = CookiePool(cookies_list) if need_cookies else None
+        # cookie 池的读写使用独立的线程池，等待 cookie 不占用默认线程池
+        self.cookie_executor = (
+            ThreadPoolExecutor(max_workers=4, thread_name_prefix="cookie")
+            if need_cookies
+            else None
+        )
+        self.is_person = requirement in (
+            "requirement_1",
+            "requirement_2",
+            "requirement_3",
+            "requirement_4",
+        )
+        self.db = database.SessionLocal()
+        # 结果交给写线程批量提交，避免同步提交阻塞事件循环
+        self.writer = DBWriter()
+        self.parser = ParsePool(parse_workers)
+        self.inflight = 0
+        self.finished = 0
+        self.failed = 0
+        self.works_counts: dict[str, Optional[str]] = {}
+        # 在途任务 id -> 任务，防止同一任务重复入队
+        self._inflight_tasks: dict[str, Any] = {}
+
+    def _claim_tasks(self, limit: int) -> list:
+        if self.is_person:
+            tasks = crud.claim_marking_mutil(self.db, self.requirement, limit)  # type: ignore
+            if self.requirement == "requirement_2":
+                # requirement_1 记录的影视作品数，决定是否请求影视作品
+                self.works_counts.update(
+                    crud.get_works_counts(
+                        self.db, [task.douban_person_id for task in tasks]
+                    )
+                )
+            return tasks
+        # 演职员和获奖信息只有电影才有
+        type = None if self.requirement == "requirement_5" else "movie"
+        return crud.claim_subject_marking_mutil(
+            self.db, self.requirement, limit, type  # type: ignore
+        )
+
+    def _save(self, task_id: str, task, result):
+        if self.is_person:
+            save, release = crud.save_marking_result, crud.release_marking
+        else:
+            save, release = (
+                crud.save_subject_marking_result,
+                crud.release_subject_marking,
+            )
+        self.writer.submit(
+            task_id,
+            partial(
+                save,
+                task=task,
+                filter=self.requirement,
+                create=self.create,
+                data=result,
+            ),
+            partial(release, task=task, filter=self.requirement, commit=False),
+        )
+
+    def _release(self, task_id: str, task):
+        release = (
+            crud.release_marking if self.is_person else crud.release_subject_marking
+        )
+        self.writer.submit(
+            task_id, partial(release, task=task, filter=self.requirement, commit=False)
+        )
+
+    def _fail(self, task_id: str, task, error: Exception):
+        """记录失败次数和错误类型，按退避时间释放租约"""
+        fail = crud.fail_marking if self.is_person else crud.fail_subject_marking
+        self.writer.submit(
+            task_id,
+            partial(
+                fail,
+                task=task,
+                filter=self.requirement,
+                error=error_name(error),
+                permanent=is_permanent(error),
+                commit=False,
+            ),
+        )
+
+    def _renew_leases(self):
+        """为排队和执行中的任务续租，任务完成前租约不会过期"""
+        tasks = list(self._inflight_tasks.values())
+        if not tasks:
+            return
+        renew = (
+            crud.renew_marking_leases
+            if self.is_person
+            else crud.renew_subject_marking_leases
+        )
+        self.writer.submit(
+            "lease heartbeat",
+            partial(
+                renew,
+                tasks=tasks,
+                filter=self.requirement,
+                lease_expires_at=datetime.now() + timedelta(seconds=crud.LEASE_SECONDS),
+                commit=False,
+            ),
+        )
+
+    def _task_id(self, task) -> str:
+        return task.douban_person_id if self.is_person else task.douban_subject_id
+
+    async def _cookie_call(self, fn: Callable[..., Any], *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(
+            self.cookie_executor, partial(fn, *args)
+        )
+
+    async def _acquire_cookie(self, requests: int) -> dict[str, str]:
+        """
+        领取 cookie 并预扣 requests 次额度，没有可用的 cookie 时在事件循环中等待，
+        最多等待 COOKIE_MAX_WAIT_SECONDS 秒，超时抛出 CookieUnavailableError
+        """
+        deadline = time.time() + COOKIE_MAX_WAIT_SECONDS
+        while True:
+            cookies, ready_at = await self._cookie_call(
+                self.cookie_pool.try_acquire, requests
+            )
+            if cookies is not None:
+                return cookies
+            if ready_at > deadline:
+                raise CookieUnavailableError(ready_at)
+            await asyncio.sleep(max(ready_at - time.time(), 0.1))
+
+    async def _wait_for_cookies(self) -> bool:
+        """没有可用的 cookie 时等待，返回是否在等待"""
+        if self.cookie_pool is None:
+            return False
+        wait = await self._cookie_call(self.cookie_pool.ready_at) - time.time()
+        if wait <= 0:
+            return False
+        logging.warning(f"No cookie available, claiming paused for {wait:.0f} seconds")
+        await asyncio.sleep(min(wait, 1))
+        return True
+
+    async def _worker(self, http: AsyncDoubanClient, queue: asyncio.Queue):
+        while True:
+            task = await queue.get()
+            if task is None:
+                queue.task_done()
+                return
+            task_id = self._task_id(task)
+            start_time = time.time()
+            cookies = None
+            self.retry_budget.deposit()
+            try:
+                kwargs = {}
+                # 每个需要登录的请求预扣一次 cookie 额度
+                requests = 1
+                if self.requirement == "requirement_2":
+                    types = await _plan_works(
+                        http, task_id, self.works_counts.pop(task_id, None)
+                    )
+                    kwargs["types"] = types
+                    requests = len(types)
+                # 没有需要请求的作品类型时不占用 cookie
+                if self.cookie_pool and requests:
+                    cookies = await self._acquire_cookie(requests)
+                scraper, raw = await self.scrape(
+                    http, task_id, cookies, getattr(task, "type", None), **kwargs
+                )
+                if cookies is not None and self.requirement == "requirement_2":
+                    # 翻页请求抓取后补扣
+                    await self._cookie_call(
+                        self.cookie_pool.charge,
+                        cookies,
+                        sum(len(pages) for pages in raw.values()) - requests,
+                    )
+                result = await asyncio.wrap_future(self.parser.submit(scraper, raw))
+                self._save(task_id, task, result)
+                if cookies is not None:
+                    await self._cookie_call(self.cookie_pool.report_ok, cookies)
+                self.finished += 1
+                logging.info(
+                    f"Scraped [{task_id}] -- {self.requirement} in {time.time() - start_time:.2f} seconds"
+                )
+            except Exception as e:
+                self.failed += 1
+                # 熔断时请求没有发出，cookie 失效或等待超时也不是任务本身的问题，不计入失败次数
+                if isinstance(
+                    e,
+                    (CircuitOpenError, CookieUnavailableError, *LOGIN_REQUIRED_ERRORS),
+                ):
+                    self._release(task_id, task)
+                else:
+                    self._fail(task_id, task, e)
+                if cookies is not None and isinstance(e, LOGIN_REQUIRED_ERRORS):
+                    await self._cookie_call(
+                        self.cookie_pool.report_login_required, cookies
+                    )
+                logging.error(f"Error occurred while scraping [{task_id}]: {e}")
+            finally:
+                self.inflight -= 1
+                self._inflight_tasks.pop(task_id, None)
+                queue.task_done()
+
+    def _mark_empty(self) -> int:
+        """上游数据已证明为空的任务直接标记完成"""
+        if self.requirement in ("requirement_3", "requirement_4"):
+            return crud.mark_empty_marking(self.db, self.requirement)  # type: ignore
+        if self.requirement in ("requirement_6", "requirement_7"):
+            return crud.mark_empty_subject_marking(self.db, self.requirement)  # type: ignore
+        return 0
+
+    async def run(self):
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency)
+        skipped = self._mark_empty()
+        if skipped:
+            logging.info(f"Marked {skipped} tasks with known empty results as finished")
+        self.writer.start()
+        async with AsyncDoubanClient(
+            self.proxy_url,
+            self.per_host_limit,
+            archive=self.archive,
+            limiter=self.limiter,
+            breakers=self.breakers,
+            cache=self.cache,
+            retry_budget=self.retry_budget,
+        ) as http:
+            workers = [
+                asyncio.create_task(self._worker(http, queue))
+                for _ in range(self.concurrency)
+            ]
+            heartbeat_at = time.monotonic()
+            try:
+                while True:
+                    if time.monotonic() - heartbeat_at >= HEARTBEAT_SECONDS:
+                        heartbeat_at = time.monotonic()
+                        self._renew_leases()
+                    wait = self.breakers.open_until() - time.time()
+                    if wait > 0:
+                        logging.warning(
+                            f"Circuit open, claiming paused for {wait:.0f} seconds"
+                        )
+                        await asyncio.sleep(min(wait, 1))
+                        continue
+                    # 没有可用的 cookie 时不领取，避免领到任务后等待 cookie 而租约过期
+                    if await self._wait_for_cookies():
+                        continue
+                    free = self.max_inflight - self.inflight
+                    tasks = self._claim_tasks(free) if free > 0 else []
+                    if not tasks:
+                        if self.inflight == 0:
+                            logging.info("No unfinished tasks, exiting...")
+                            break
+                        await asyncio.sleep(1)
+                        continue
+                    for task in tasks:
+                        task_id = self._task_id(task)
+                        inflight_task = self._inflight_tasks.get(task_id)
+                        if inflight_task is not None:
+                            crud.adopt_claim(inflight_task, task, self.requirement)
+                            continue
+                        self._inflight_tasks[task_id] = task
+                        self.inflight += 1
+                        await queue.put(task)
+            finally:
+                for _ in workers:
+                    await queue.put(None)
+                await asyncio.gather(*workers)
+                self.db.close()
+                self.writer.close()
+                self.parser.close()
+                if self.limiter is not None:
+                    self.limiter.close()
+                if self.cookie_executor is not None:
+                    self.cookie_executor.shutdown()
+                if self.cookie_pool is not None:
+                    self.cookie_pool.close()
+        logging.info(
+            f"Finished {self.finished} tasks, {self.failed} failed in this run"
+        )
+        logging.info(
+            f"Retries: {self.retry_budget.retried} retried, "
+            f"{self.retry_budget.rejected} rejected by budget"
+        )
+        if self.cache is not None:
+            logging.info(f"HTTP cache: {self.cache.metrics()}")
+
+
+def run(
+    requirement: Requirement,
+    concurrency: int = 1000,
+    per_host_limit: int = 200,
+    proxy_url: Optional[str] = None,
+    cookies_list: Optional[list[dict]] = None,
+    parse_workers: Optional[int] = PARSE_WORKERS,
+    rate: Optional[float] = None,
+    http_cache: bool = False,
+):
+    engine = AsyncCrawlEngine(
+        requirement,
+        concurrency,
+        per_host_limit,
+        proxy_url,
+        cookies_list,
+        parse_workers=parse_workers,
+        rate=rate,
+        http_cache=http_cache,
+    )
+    asyncio.run(engine.run())
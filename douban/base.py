@@ -0,0 +1,53 @@
+from typing import Any, Optional
+
+import requests
+
+from douban.client import DoubanClient, get_client
+
+
+class BaseScraper:
+    """采集器基类，统一通过共享的 DoubanClient 发送请求"""
+
+    def __init__(
+        self,
+        proxy_url: Optional[str] = None,
+        cookies: Optional[dict[str, str]] = None,
+        client: Optional[DoubanClient] = None,
+    ):
+        self._client = client
+        # 单个采集器指定的代理/cookies 优先于客户端默认配置
+        self.proxies = {"http": proxy_url, "https": proxy_url} if proxy_url else None
+        self.cookies = cookies
+
+    @property
+    def client(self) -> DoubanClient:
+        return self._client if self._client is not None else get_client()
+
+    @property
+    def headers(self) -> dict[str, str]:
+        return self.client.headers
+
+    def fetch_raw(self) -> Any:
+        """只发送请求，返回解析需要的原始页面（可以发送到解析进程）"""
+        raise NotImplementedError
+
+    def parse_raw(self, raw: Any) -> Any:
+        """解析 fetch_raw 的返回值，不发送请求"""
+        raise NotImplementedError
+
+    def __getstate__(self):
+        # 客户端持有连接池和锁，不能发送到其他进程，解析时也用不到
+        state = self.__dict__.copy()
+        state["_client"] = None
+        return state
+
+    def _get(
+        self, url: str, params: Optional[dict[str, Any]] = None, **kwargs
+    ) -> requests.Response:
+        return self.client.get(
+            url,
+            params=params,
+            proxies=self.proxies,
+            cookies=self.cookies,
+            **kwargs,
+        )
@@ -0,0 +1,228 @@
+import logging
+import threading
+import time
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from circuit_breaker import CircuitBreakers
+from douban.archive import ARCHIVE_DIR, PageArchive
+from douban.http_cache import HttpCache
+from concurrency import AIMDController
+from proxy_pool import ProxyPool
+from rate_limiter import DEFAULT_HOST_RATE, RATE_LIMIT_DB, HostRateLimiter
+
+# 所有采集器共用的请求头
+HEADERS = {
+    "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
+    "accept-language": "zh-CN,zh;q=0.9,en;q=0.8,en-GB;q=0.7,en-US;q=0.6",
+    "priority": "u=0, i",
+    "sec-ch-ua": '"Microsoft Edge";v="131", "Chromium";v="131", "Not_A Brand";v="24"',
+    "sec-ch-ua-mobile": "?0",
+    "sec-ch-ua-platform": '"Windows"',
+    "sec-fetch-dest": "document",
+    "sec-fetch-mode": "navigate",
+    "sec-fetch-site": "same-origin",
+    "sec-fetch-user": "?1",
+    "upgrade-insecure-requests": "1",
+    "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36 Edg/131.0.0.0",
+}
+
+# 每个 host 的连接池设置
+POOL_CONNECTIONS = 10  # 缓存的 host 连接池个数
+POOL_MAXSIZE = 50  # 每个 host 保持的 keep-alive 连接数
+TIMEOUT = 20
+
+
+class DoubanClient:
+    """
+    线程安全的共享 HTTP 客户端。
+    底层 urllib3 连接池按 host 复用 keep-alive 连接，避免每次请求重新握手 TCP+TLS。
+    cookies 按请求传入，不写入 session，避免线程之间互相污染。
+    配置了 archive 时，每个成功的响应正文都会写入页面归档，供离线重新解析。
+    配置了 limiter 时，每个请求先按 host 取令牌，所有线程和进程共用同一组令牌桶。
+    配置了 controller 时，每个请求的耗时和状态码反馈给并发控制器。
+    配置了 proxy_pool 时，未指定代理的请求由代理池挑选代理，结果反馈给代理池。
+    配置了 breakers 时，熔断中的接口直接抛出 CircuitOpenError，不发出请求。
+    配置了 cache 时，缓存期内的页面直接由归档返回，过期的页面发条件请求。
+    """
+
+    def __init__(
+        self,
+        proxy_url: Optional[str] = None,
+        cookies: Optional[dict[str, str]] = None,
+        pool_connections: int = POOL_CONNECTIONS,
+        pool_maxsize: int = POOL_MAXSIZE,
+        timeout: float = TIMEOUT,
+        archive: Optional[PageArchive] = None,
+        limiter: Optional[HostRateLimiter] = None,
+        controller: Optional[AIMDController] = None,
+        proxy_pool: Optional[ProxyPool] = None,
+        breakers: Optional[CircuitBreakers] = None,
+        cache: Optional[HttpCache] = None,
+    ):
+        self.headers = dict(HEADERS)
+        self.archive = archive
+        self.limiter = limiter
+        self.controller = controller
+        self.proxy_pool = proxy_pool
+        self.breakers = breakers
+        self.cache = cache
+        self.proxies = {"http": proxy_url, "https": proxy_url} if proxy_url else None
+        self.cookies = cookies or {}
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(
+        self,
+        url: str,
+        params: Optional[dict[str, Any]] = None,
+        proxies: Optional[dict[str, str]] = None,
+        cookies: Optional[dict[str, str]] = None,
+        **kwargs,
+    ) -> requests.Response:
+        """发送 GET 请求，未指定 proxies/cookies 时使用客户端默认值"""
+        kwargs.setdefault("timeout", self.timeout)
+        cache_key = None
+        if self.cache is not None:
+            cache_key = request_url(url, params)
+            cached = self.cache.fresh(cache_key)
+            if cached is not None:
+                return cached
+            kwargs["headers"] = {
+                **self.cache.conditional_headers(cache_key),
+                **(kwargs.get("headers") or {}),
+            }
+        if self.breakers is not None:
+            self.breakers.before(url)
+        if self.limiter is not None:
+            self.limiter.acquire(urlsplit(url).hostname or "")
+        proxy = None
+        if proxies is None and self.proxy_pool is not None:
+            proxy = self.proxy_pool.acquire()
+            proxies = {"http": proxy, "https": proxy}
+        status = None
+        start_time = time.monotonic()
+        try:
+            response = self.session.get(
+                url,
+                params=params,
+                proxies=proxies or self.proxies,
+                cookies=cookies or self.cookies or None,
+                **kwargs,
+            )
+            status = response.status_code
+        finally:
+            # status 为 None 表示连接失败或超时
+            latency = time.monotonic() - start_time
+            if self.controller is not None:
+                self.controller.observe(latency, status)
+            if self.breakers is not None:
+                self.breakers.record(url, status)
+            if proxy is not None:
+                self.proxy_pool.release(proxy, latency, status)  # type: ignore
+        if cache_key is not None:
+            response = self.cache.update(cache_key, response)  # type: ignore
+        if self.archive is not None and response.status_code == 200:
+            self._archive(response)
+        return response
+
+    def _archive(self, response: requests.Response):
+        # 以请求的原始 url（含查询参数）为键，重定向后的页面也归到原 url 下
+        request = response.history[0].request if response.history else response.request
+        try:
+            self.archive.put(request.url, response.content, response.status_code)  # type: ignore
+        except Exception as e:
+            logging.warning(f"Failed to archive {request.url}: {e}")
+
+    def close(self):
+        self.session.close()
+        if self.cache is not None:
+            logging.info(f"HTTP cache: {self.cache.metrics()}")
+        if self.limiter is not None:
+            self.limiter.close()
+
+
+def create_limiter(
+    rate: Optional[float] = None,
+    burst: int = DEFAULT_HOST_RATE[1],
+    rate_limit_db: Optional[str] = RATE_LIMIT_DB,
+) -> Optional[HostRateLimiter]:
+    """rate 为 None 时按 HOST_RATES 限速，否则所有 host 都使用 (rate, burst)"""
+    if rate_limit_db is None:
+        return None
+    if rate is None:
+        return HostRateLimiter(rate_limit_db)
+    return HostRateLimiter(rate_limit_db, rates={}, default=(rate, burst))
+
+
+def request_url(url: str, params: Optional[dict[str, Any]] = None) -> str:
+    """与 requests 发送请求时相同的 url 拼接方式，即页面归档中的键"""
+    return requests.Request("GET", url, params=params).prepare().url  # type: ignore
+
+
+_client: Optional[DoubanClient] = None
+_client_lock = threading.Lock()
+
+
+def configure(
+    proxy_url: Optional[str] = None,
+    cookies: Optional[dict[str, str]] = None,
+    archive_dir: Optional[str] = ARCHIVE_DIR,
+    rate: Optional[float] = None,
+    burst: int = DEFAULT_HOST_RATE[1],
+    rate_limit_db: Optional[str] = RATE_LIMIT_DB,
+    controller: Optional[AIMDController] = None,
+    proxy_urls: Optional[list[str]] = None,
+    breakers: Optional[CircuitBreakers] = None,
+    http_cache: bool = False,
+    cache_ttls: Optional[list[tuple[str, float]]] = None,
+    **kwargs,
+) -> DoubanClient:
+    """
+    配置全局客户端（代理、cookies、连接池大小、限速），返回新的客户端。
+    archive_dir 为页面归档目录，传 None 时不归档。
+    rate 为每个 host 每秒最多发出的请求数，None 时使用 HOST_RATES 中的配置；
+    rate_limit_db 为多进程共享的限速状态文件，传 None 时不限速。
+    controller 为并发控制器，请求结果会反馈给它。
+    proxy_urls 不为空时使用代理池，按健康状况为每个请求挑选代理。
+    breakers 为按接口熔断的状态，请求结果会反馈给它。
+    http_cache 为 True 且配置了归档时启用 HTTP 缓存，cache_ttls 为各类页面的缓存时长，None 时使用 CACHE_TTLS。
+    """
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        archive = PageArchive(archive_dir) if archive_dir else None
+        _client = DoubanClient(
+            proxy_url,
+            cookies,
+            archive=archive,
+            limiter=create_limiter(rate, burst, rate_limit_db),
+            controller=controller,
+            proxy_pool=ProxyPool(proxy_urls) if proxy_urls else None,
+            breakers=breakers,
+            cache=HttpCache(archive, cache_ttls) if http_cache and archive else None,
+            **kwargs,
+        )
+        return _client
+
+
+def get_client() -> DoubanClient:
+    """获取全局客户端，未配置时使用默认配置创建"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = DoubanClient(
+                    archive=PageArchive(ARCHIVE_DIR), limiter=create_limiter()
+                )
+    return _client
@@ -0,0 +1,21 @@
+from bs4 import BeautifulSoup
+from lxml import etree
+
+# BeautifulSoup 使用的解析后端，lxml 比内置的 html.parser 快数倍
+PARSER = "lxml"
+
+
+def configure(parser: str):
+    """切换解析后端，例如 "lxml"、"html.parser"、"html5lib" """
+    global PARSER
+    PARSER = parser
+
+
+def parse_html(html: str | bytes) -> BeautifulSoup:
+    """所有采集器统一通过这里构建文档树"""
+    return BeautifulSoup(html, PARSER)
+
+
+def parse_tree(html: str | bytes):
+    """只需要 xpath 时直接使用 lxml 的元素树，省去构建 BeautifulSoup 对象的开销"""
+    return etree.HTML(html)  # type: ignore
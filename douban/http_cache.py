@@ -0,0 +1,168 @@
+import hashlib
+import logging
+import re
+import time
+from typing import Mapping, Optional
+
+import requests
+
+from douban.archive import PageArchive
+
+DAY = 24 * 3600
+
+# 各类页面的缓存时长（秒），按顺序匹配请求 url，第一个匹配的生效。
+# 缓存期内直接使用归档中的正文，不发请求；过期后发条件请求，304 时仍使用归档中的正文。
+CACHE_TTLS: list[tuple[str, float]] = [
+    # 演职员和获奖情况很少变化
+    (r"\.douban\.com/subject/\d+/celebrities", 30 * DAY),
+    (r"\.douban\.com/subject/\d+/awards/", 30 * DAY),
+    (r"www\.douban\.com/personage/\d+/awards", 30 * DAY),
+    # 人物主页和作品列表随新作品变化
+    # （合作人物接口的第一页由 douban.partners.archived_first_page 复用，不经过缓存）
+    (r"www\.douban\.com/personage/\d+/creations", 7 * DAY),
+    (r"www\.douban\.com/personage/\d+/(\?|$)", 7 * DAY),
+    # 作品页上的评分和评价人数变化快
+    (r"\.douban\.com/subject/\d+/(\?|$)", 1 * DAY),
+]
+# 未匹配的页面每次都发条件请求
+DEFAULT_TTL = 0
+# 输出命中、重新验证和未命中次数的间隔秒数
+REPORT_SECONDS = 60
+
+_LOGIN_TITLE = re.compile(r"<title>[^<]*登录".encode("utf-8"), re.IGNORECASE)
+
+
+def _cached_response(url: str, body: bytes, cache_status: str) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response._content = body
+    response.encoding = "utf-8"
+    response.headers["X-Cache"] = cache_status
+    return response
+
+
+class HttpCache:
+    """
+    基于页面归档的 HTTP 缓存。
+    每个 url 记录最近一次响应的 ETag、Last-Modified 和正文 sha256（正文本身在归档中）。
+    缓存期内的请求直接由归档返回；过期后带上 If-None-Match / If-Modified-Since 发条件请求，
+    服务器返回 304 时用归档中的正文构造 200 响应，重新抓取时只传输很小的响应。
+    只缓存未经重定向的 200 响应，标题含“登录”的页面（cookie 失效时返回的登录页）也不缓存。
+    """
+
+    def __init__(
+        self,
+        archive: PageArchive,
+        ttls: Optional[list[tuple[str, float]]] = None,
+        default_ttl: float = DEFAULT_TTL,
+        report_seconds: float = REPORT_SECONDS,
+    ):
+        self.archive = archive
+        self.ttls = [
+            (re.compile(pattern), ttl)
+            for pattern, ttl in (CACHE_TTLS if ttls is None else ttls)
+        ]
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.report_seconds = report_seconds
+        self._reported_at = time.monotonic()
+
+    def _report(self):
+        if time.monotonic() - self._reported_at >= self.report_seconds:
+            self._reported_at = time.monotonic()
+            logging.info(f"HTTP cache: {self.metrics()}")
+
+    def ttl(self, url: str) -> float:
+        for pattern, ttl in self.ttls:
+            if pattern.search(url):
+                return ttl
+        return self.default_ttl
+
+    def fresh_body(self, url: str) -> Optional[bytes]:
+        """缓存期内时返回归档中的正文，否则返回 None"""
+        validators = self.archive.validators(url)
+        if validators is None or time.time() - validators.validated_at > self.ttl(url):
+            return None
+        try:
+            body = self.archive.get_blob(validators.sha256)
+        except (KeyError, OSError):
+            return None
+        self.hits += 1
+        self._report()
+        return body
+
+    def conditional_headers(self, url: str) -> dict[str, str]:
+        """条件请求头，没有验证信息或归档中没有正文时返回空字典"""
+        validators = self.archive.validators(url)
+        if validators is None or not self.archive.has_blob(validators.sha256):
+            return {}
+        headers = {}
+        if validators.etag:
+            headers["If-None-Match"] = validators.etag
+        if validators.last_modified:
+            headers["If-Modified-Since"] = validators.last_modified
+        return headers
+
+    def not_modified(self, url: str, headers: Mapping[str, str]) -> Optional[bytes]:
+        """服务器返回 304 时刷新验证时间，返回归档中的正文；正文缺失时返回 None"""
+        validators = self.archive.validators(url)
+        if validators is None:
+            return None
+        try:
+            body = self.archive.get_blob(validators.sha256)
+        except (KeyError, OSError):
+            return None
+        self.archive.put_validators(
+            url,
+            headers.get("ETag") or validators.etag,
+            headers.get("Last-Modified") or validators.last_modified,
+            validators.sha256,
+        )
+        self.revalidated += 1
+        self._report()
+        return body
+
+    def store(self, url: str, headers: Mapping[str, str], body: bytes):
+        """记录未经重定向的 200 响应的验证信息，登录页不记录"""
+        self.misses += 1
+        self._report()
+        if _LOGIN_TITLE.search(body):
+            return
+        self.archive.put_validators(
+            url,
+            headers.get("ETag"),
+            headers.get("Last-Modified"),
+            hashlib.sha256(body).hexdigest(),
+        )
+
+    def fresh(self, url: str) -> Optional[requests.Response]:
+        """缓存期内时由归档返回响应，否则返回 None"""
+        body = self.fresh_body(url)
+        return _cached_response(url, body, "HIT") if body is not None else None
+
+    def update(self, url: str, response: requests.Response) -> requests.Response:
+        """
+        根据响应更新验证信息。304 时返回由归档正文构造的 200 响应，
+        其余情况原样返回。
+        """
+        if response.status_code == 304:
+            body = self.not_modified(url, response.headers)
+            if body is None:
+                return response
+            cached = _cached_response(url, body, "REVALIDATED")
+            cached.history = response.history
+            cached.request = response.request
+            return cached
+        if response.status_code == 200 and not response.history:
+            self.store(url, response.headers, response.content)
+        return response
+
+    def metrics(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+        }
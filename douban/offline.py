@@ -0,0 +1,151 @@
+import json
+from typing import Any, Literal, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from douban.archive import ARCHIVE_DIR, PageArchive
+from douban.client import request_url
+from douban.requirement_1 import DoubanPersonScraper
+from douban.requirement_2 import WORK_TYPES, DoubanWorkScraper
+from douban.requirement_3 import DoubanAwardScraper
+from douban.requirement_4 import DoubanCollaborationScraper
+from douban.requirement_5 import DoubanSubjectScraper
+from douban.requirement_6 import DoubanCastScraper
+from douban.requirement_7 import DoubanSubjectAwardScraper
+
+# 离线解析：从页面归档读取页面，复用各采集器的 parse 方法，不发送任何请求。
+# 供 reparse.py 在进程池中调用，因此这里不导入数据库模块。
+
+# 每个工作进程各自打开归档
+_archive: Optional[PageArchive] = None
+
+
+class MissingPage(KeyError):
+    """归档中没有需要的页面"""
+
+
+def init_worker(archive_dir: str = ARCHIVE_DIR):
+    global _archive
+    _archive = PageArchive(archive_dir)
+
+
+def _text(url: str, params: Optional[dict[str, Any]] = None) -> str:
+    assert _archive is not None, "init_worker() must be called first"
+    page = _archive.latest(request_url(url, params))
+    if page is None:
+        raise MissingPage(request_url(url, params))
+    return page.text
+
+
+def _json(url: str, params: Optional[dict[str, Any]] = None) -> Any:
+    return json.loads(_text(url, params))
+
+
+def _optional(load, *args):
+    try:
+        return load(*args)
+    except MissingPage:
+        return None
+
+
+def _person(task_id: str, type):
+    scraper = DoubanPersonScraper(task_id)
+    works_html = _optional(_text, scraper.works_count_url)
+    partners = _optional(_json, scraper.partners_api_url, scraper.partners_params())
+    return scraper.parse(
+        _text(scraper.douban_url),
+        scraper.parse_works_count(works_html) if works_html else None,
+        scraper.parse_co_star_count(partners) if partners else None,
+    )
+
+
+def _works(task_id: str, type):
+    scraper = DoubanWorkScraper(task_id, {})
+    url = scraper.douban_url + "creations"
+    works = []
+    archived_types = 0
+    for work_type in WORK_TYPES:
+        # run_2 按 plan_types 跳过了没有作品的类型，这些类型的第一页不在归档中，按空处理
+        html = _optional(_text, url, scraper.works_page_params(0, work_type))
+        if html is None:
+            continue
+        archived_types += 1
+        total_page, results = scraper.parse_works_page(html, work_type)
+        for page in range(1, total_page):
+            html = _text(url, scraper.works_page_params(page, work_type))
+            results.extend(scraper.parse_works_page(html, work_type)[1])
+        works.extend(results)
+    if not archived_types:
+        raise MissingPage(url)
+    return works
+
+
+def _awards(task_id: str, type):
+    scraper = DoubanAwardScraper(task_id)
+    return scraper.parse_awards(_text(scraper.star_award_url))
+
+
+def _collaborations(task_id: str, type):
+    assert _archive is not None, "init_worker() must be called first"
+    scraper = DoubanCollaborationScraper(task_id)
+    # 各页的页大小不固定，按 start 找出归档中的各页后依次拼接
+    pages: dict[int, tuple[int, str]] = {}
+    for url, _, _ in _archive.iter_latest(scraper.partners_api_url + "?%"):
+        query = parse_qs(urlsplit(url).query)
+        start, count = int(query["start"][0]), int(query["count"][0])
+        if count > pages.get(start, (0, ""))[0]:
+            pages[start] = (count, url)
+    items: list[dict] = []
+    total = None
+    while total is None or len(items) < total:
+        if len(items) not in pages:
+            raise MissingPage(scraper.partners_api_url)
+        page = json.loads(_text(pages[len(items)][1]))
+        total = page.get("total", 0) if total is None else total
+        page_items = page.get("items") or []
+        if not page_items:
+            break
+        items.extend(page_items)
+    return scraper.parse_items(items)
+
+
+def _subject(task_id: str, type):
+    scraper = DoubanSubjectScraper(task_id, type)
+    return scraper.parse_subject(_text(scraper.subject_url))
+
+
+def _casts(task_id: str, type):
+    scraper = DoubanCastScraper(task_id)
+    return scraper.parse(_text(scraper.cast_url))
+
+
+def _subject_awards(task_id: str, type):
+    scraper = DoubanSubjectAwardScraper(task_id)
+    return scraper.parse(_text(scraper.awards_url))
+
+
+PARSERS = {
+    "requirement_1": _person,
+    "requirement_2": _works,
+    "requirement_3": _awards,
+    "requirement_4": _collaborations,
+    "requirement_5": _subject,
+    "requirement_6": _casts,
+    "requirement_7": _subject_awards,
+}
+
+
+def reparse_task(
+    requirement: str,
+    task_id: str,
+    type: Optional[Literal["movie", "book", "music"]] = None,
+) -> tuple[str, Optional[str], Any, Optional[str]]:
+    """
+    在工作进程中解析一个任务，返回 (任务 id, 类型, 解析结果, 错误)。
+    归档中缺少页面时结果为 None、错误为 "missing"。
+    """
+    try:
+        return task_id, type, PARSERS[requirement](task_id, type), None
+    except MissingPage:
+        return task_id, type, None, "missing"
+    except Exception as e:
+        return task_id, type, None, str(e) or e.__class__.__name__
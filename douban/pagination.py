@@ -0,0 +1,31 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# 所有采集器共用的翻页线程数，请求节奏由客户端的限速器控制
+PAGE_WORKERS = 8
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(PAGE_WORKERS, thread_name_prefix="page")
+    return _executor
+
+
+def fetch_pages(fetch: Callable[[int], T], pages: Iterable[int]) -> list[T]:
+    """
+    已知总页数后同时请求剩余页，按页码顺序返回结果。
+    任一页失败时抛出该页的异常。
+    """
+    pages = list(pages)
+    if len(pages) <= 1:
+        return [fetch(page) for page in pages]
+    return list(_get_executor().map(fetch, pages))
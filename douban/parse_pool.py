@@ -0,0 +1,52 @@
+import os
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from typing import Any, Optional
+
+from douban.base import BaseScraper
+
+# 默认的解析进程数
+PARSE_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+
+
+def parse_raw(scraper: BaseScraper, raw: Any) -> Any:
+    """在解析进程中执行，只做 CPU 计算，不发送请求"""
+    return scraper.parse_raw(raw)
+
+
+class ParsePool:
+    """
+    解析进程池。
+    抓取线程只负责网络请求，拿到原始页面后交给进程池构建文档树并提取字段，
+    避免 BeautifulSoup 解析占住 GIL 拖慢其他线程的请求。
+    workers 为 0 时在当前线程中解析，便于调试。
+    """
+
+    def __init__(self, workers: Optional[int] = PARSE_WORKERS):
+        self.workers = PARSE_WORKERS if workers is None else workers
+        self.executor: Optional[Executor] = (
+            ProcessPoolExecutor(self.workers) if self.workers > 0 else None
+        )
+
+    def submit(self, scraper: BaseScraper, raw: Any) -> Future:
+        if self.executor is not None:
+            return self.executor.submit(parse_raw, scraper, raw)
+        future: Future = Future()
+        try:
+            future.set_result(parse_raw(scraper, raw))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def parse(self, scraper: BaseScraper, raw: Any) -> Any:
+        """阻塞直到解析完成，解析中的异常在调用方重新抛出"""
+        return self.submit(scraper, raw).result()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,67 @@
+import json
+import time
+from typing import Any, Optional
+
+from douban.archive import PageArchive
+from douban.client import request_url
+
+# requirement_1 和 requirement_4 共用 rexxar 合作人物接口：
+# requirement_1 只读第一页的 total，requirement_4 从第一页开始翻页。
+# 两者使用相同的页大小，第一页的 url 相同，requirement_4 可以直接复用归档中的第一页。
+
+# 第一页的人数，requirement_1 和 requirement_4 必须一致
+PARTNERS_PAGE_SIZE = 10
+# 归档中的第一页在该时长（秒）内视为有效
+PARTNERS_MAX_AGE = 7 * 24 * 3600
+# 第一页之后每页请求的人数上限，接口实际接受的页大小在运行中探测
+PARTNERS_MAX_COUNT = 100
+
+# 当前进程探测到的页大小
+_page_size = PARTNERS_MAX_COUNT
+
+
+def partners_api_url(douban_person_id: str) -> str:
+    return f"https://m.douban.com/rexxar/api/v2/elessar/subject/{douban_person_id}/partners"
+
+
+def partners_params(start: int = 0, count: int = PARTNERS_PAGE_SIZE) -> dict[str, str]:
+    return {
+        "start": f"{start}",
+        "count": f"{count}",
+        "name": "",
+        "simple": "0",
+    }
+
+
+def page_size() -> int:
+    return _page_size
+
+
+def observe_page(requested: int, received: int, remaining: int):
+    """
+    返回的人数少于请求数、且还没有取完时，说明请求数超过了接口允许的最大值，
+    之后按实际返回的人数分页。
+    """
+    global _page_size
+    if 0 < received < min(requested, remaining):
+        _page_size = min(_page_size, received)
+
+
+def archived_first_page(
+    archive: Optional[PageArchive],
+    douban_person_id: str,
+    max_age: float = PARTNERS_MAX_AGE,
+) -> Optional[dict[str, Any]]:
+    """归档中未过期的第一页接口数据，没有时返回 None"""
+    if archive is None:
+        return None
+    page = archive.latest(
+        request_url(partners_api_url(douban_person_id), partners_params())
+    )
+    if page is None or page.status != 200 or time.time() - page.fetched_at > max_age:
+        return None
+    try:
+        data = json.loads(page.text)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) and "total" in data else None
@@ -1,50 +1,52 @@
 import re
-from bs4 import BeautifulSoup
-import requests
-from lxml import etree
 from pydantic import BaseModel, Field
 from typing import Optional
 from db.schemas import DoubanPerson
-from retry import retry
+from douban.base import BaseScraper
+from douban.partners import PARTNERS_PAGE_SIZE, partners_api_url, partners_params
+from douban.html_parser import parse_html, parse_tree
 
 
-class DoubanPersonScraper:
+class DoubanPersonScraper(BaseScraper):
 
     def __init__(self, douban_person_id: str, proxy_url: Optional[str] = None):
+        super().__init__(proxy_url)
         self.douban_person_id = douban_person_id
         self.douban_url = f"https://www.douban.com/personage/{douban_person_id}/"
-        self.headers = {
-            "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
-            "accept-language": "zh-CN,zh;q=0.9,en;q=0.8,en-GB;q=0.7,en-US;q=0.6",
-            "priority": "u=0, i",
-            "sec-ch-ua": '"Microsoft Edge";v="131", "Chromium";v="131", "Not_A Brand";v="24"',
-            "sec-ch-ua-mobile": "?0",
-            "sec-ch-ua-platform": '"Windows"',
-            "sec-fetch-dest": "document",
-            "sec-fetch-mode": "navigate",
-            "sec-fetch-site": "same-origin",
-            "sec-fetch-user": "?1",
-            "upgrade-insecure-requests": "1",
-            "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36 Edg/131.0.0.0",
-        }
-        self.proxies = {"http": proxy_url, "https": proxy_url} if proxy_url else None
         self.html = ""
 
-    @retry(tries=3, delay=2, backoff=2)
+    @property
+    def works_count_url(self) -> str:
+        return self.douban_url + "creations?sortby=collection&type=filmmaker"
+
+    @property
+    def partners_api_url(self) -> str:
+        return partners_api_url(self.douban_person_id)
+
+    @staticmethod
+    def partners_params(
+        start: int = 0, count: int = PARTNERS_PAGE_SIZE
+    ) -> dict[str, str]:
+        return partners_params(start, count)
+
+    def _get_home_page_html(self) -> str:
+        response = self._get(self.douban_url)
+        response.raise_for_status()
+        return response.text
+
     def get_home_page(self):
-        response = requests.get(
-            self.douban_url, headers=self.headers, proxies=self.proxies
-        )
+        self.html = self._get_home_page_html()
+
+    def _get_works_count_html(self) -> str:
+        response = self._get(self.works_count_url)
         response.raise_for_status()
-        self.html = response.text
+        return response.text
 
-    @retry(tries=3, delay=2, backoff=2)
     def get_works_count(self) -> Optional[str]:
-        url = self.douban_url + "creations?sortby=collection&type=filmmaker"
-        response = requests.get(url, headers=self.headers, proxies=self.proxies)
-        response.raise_for_status()
-        html = response.text
-        dom = etree.HTML(html)  # type: ignore
+        return self.parse_works_count(self._get_works_count_html())
+
+    def parse_works_count(self, html: str) -> Optional[str]:
+        dom = parse_tree(html)
         h1_element = dom.xpath('//*[@id="content"]/h1')
         if h1_element:
             h1_text = h1_element[0].text
@@ -52,28 +54,43 @@ class DoubanPersonScraper:
             return number.group().replace("(", "").replace(")", "") if number else None
         return None
 
-    @retry(tries=3, delay=2, backoff=2)
-    def get_co_star_count(self) -> Optional[str]:
-        params = {
-            "start": "0",
-            "count": "10",
-            "name": "",
-            "simple": "0",
-        }
-        response = requests.get(
-            f"https://m.douban.com/rexxar/api/v2/elessar/subject/{self.douban_url.split('/')[-2]}/partners",
-            params=params,
-            headers=self.headers,
-            proxies=self.proxies,
-        )
+    def _get_partners_json(self) -> dict:
+        response = self._get(self.partners_api_url, params=self.partners_params())
         response.raise_for_status()
-        return str(response.json()["total"])
+        return response.json()
+
+    def get_co_star_count(self) -> Optional[str]:
+        return self.parse_co_star_count(self._get_partners_json())
+
+    def parse_co_star_count(self, data: dict) -> Optional[str]:
+        return str(data["total"])
 
     def scrape(self) -> DoubanPerson:
-        if self.html == "":
-            self.get_home_page()
+        return self.parse_raw(self.fetch_raw())
+
+    def fetch_raw(self) -> tuple[str, str, dict]:
+        return (
+            self.html or self._get_home_page_html(),
+            self._get_works_count_html(),
+            self._get_partners_json(),
+        )
+
+    def parse_raw(self, raw: tuple[str, str, dict]) -> DoubanPerson:
+        html, works_html, partners = raw
+        return self.parse(
+            html,
+            self.parse_works_count(works_html),
+            self.parse_co_star_count(partners),
+        )
 
-        soup = BeautifulSoup(self.html, "html.parser")
+    def parse(
+        self,
+        html: str,
+        works_count: Optional[str] = None,
+        co_star_count: Optional[str] = None,
+    ) -> DoubanPerson:
+        """解析人物主页，works_count/co_star_count 由额外请求获得"""
+        soup = parse_html(html)
 
         douban_id_element = soup.select_one(".subject-name")
         douban_id = douban_id_element.text if douban_id_element else None
@@ -126,6 +143,10 @@ class DoubanPersonScraper:
             awards_count_text = awards_count_element.get_text()
             awards_count_match = re.search(r"(\d+)", awards_count_text)
             awards_count = awards_count_match.group() if awards_count_match else None
+        elif any("获奖" in h2.get_text() for h2 in soup.select("h2")):
+            # 页面上有获奖栏目但其中没有获奖链接，说明没有获奖记录；
+            # 栏目缺失（页面改版或不完整）时无法判断，保持 None，不会被当作没有获奖而跳过任务
+            awards_count = "0"
 
         homepage_contributors_element = soup.select_one('a[href*="contributors"]')
         homepage_contributors = None
@@ -156,11 +177,11 @@ class DoubanPersonScraper:
             introduction=introduction,
             homepage_pictures_count=homepage_pictures_count,
             homepage_pictures_url=self.douban_url + "photos/",
-            works_count=self.get_works_count(),
+            works_count=works_count,
             works_url=self.douban_url + "creations?sortby=time&type=filmmaker",
             awards_count=awards_count,
             awards_url=self.douban_url + "awards",
-            co_star_count=self.get_co_star_count(),
+            co_star_count=co_star_count,
             co_star_url=self.douban_url + "partners",
             homepage_contributors=homepage_contributors,
             homepage_contributors_url=self.douban_url + "contributors",
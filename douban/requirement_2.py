@@ -1,19 +1,23 @@
-import time
-import requests
 from bs4 import BeautifulSoup, Tag, ResultSet
 from typing import List
 from pydantic import BaseModel, Field
 from typing import Optional, Literal
 import re
-from retry import retry
 from db.schemas import DoubanWorkCreate
+from douban.base import BaseScraper
+from douban.html_parser import parse_html
+from douban.pagination import fetch_pages
 
 
 class DoubanWork(DoubanWorkCreate):
     pass
 
 
-class DoubanWorkScraper:
+WorkType = Literal["filmmaker", "writer", "musician"]
+WORK_TYPES: tuple[WorkType, ...] = ("filmmaker", "musician", "writer")
+
+
+class DoubanWorkScraper(BaseScraper):
 
     def __init__(
         self,
@@ -21,33 +25,17 @@ class DoubanWorkScraper:
         cookies: dict[str, str],
         proxy_url: str | None = None,
     ):
+        super().__init__(proxy_url, cookies)
         self.douban_person_id = douban_person_id
         self.douban_url = f"https://www.douban.com/personage/{douban_person_id}/"
-        self.headers = {
-            "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
-            "accept-language": "zh-CN,zh;q=0.9,en;q=0.8,en-GB;q=0.7,en-US;q=0.6",
-            "priority": "u=0, i",
-            "sec-ch-ua": '"Microsoft Edge";v="131", "Chromium";v="131", "Not_A Brand";v="24"',
-            "sec-ch-ua-mobile": "?0",
-            "sec-ch-ua-platform": '"Windows"',
-            "sec-fetch-dest": "document",
-            "sec-fetch-mode": "navigate",
-            "sec-fetch-site": "same-origin",
-            "sec-fetch-user": "?1",
-            "upgrade-insecure-requests": "1",
-            "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36 Edg/131.0.0.0",
-        }
-        self.proxies = {"http": proxy_url, "https": proxy_url} if proxy_url else None
-        self.cookies = cookies
 
     class LoginRequiredError(Exception):
         pass
 
-    @retry(tries=3, delay=2, backoff=2)
-    def _get_douban_works_html(
+    def works_page_params(
         self, start_page: int, type: Literal["filmmaker", "writer", "musician"]
-    ):
-        params = {
+    ) -> dict[str, str]:
+        return {
             "type": type,
             "start": f"{0 + start_page * 10}",
             "sortby": "collection",
@@ -55,20 +43,104 @@ class DoubanWorkScraper:
             "format": "pic",
         }
 
-        response = requests.get(
+    def _get_douban_works_html(
+        self, start_page: int, type: Literal["filmmaker", "writer", "musician"]
+    ) -> str:
+        response = self._get(
             self.douban_url + "creations",
-            params=params,
-            headers=self.headers,
-            proxies=self.proxies,
-            cookies=self.cookies,
+            params=self.works_page_params(start_page, type),
         )
         response.raise_for_status()  # Raise an error for bad responses
+        return response.text
+
+    def parse_works_page(
+        self, html: str, type: Literal["filmmaker", "writer", "musician"]
+    ) -> tuple[int, List[DoubanWork]]:
+        """解析一页作品，返回 (总页数, 作品列表)"""
+        soup = parse_html(html)
         # 检查网页标题
-        soup = BeautifulSoup(response.text, "html.parser")
         title = soup.title.string if soup.title else ""
         if "登录" in str(title):  # 如果标题中包含“登录”
             raise self.LoginRequiredError("登录限制")
-        return soup
+        # 总页数
+        total_page_element = soup.select_one(".thispage")
+        total_page = int(total_page_element.attrs.get("data-total-page")) if total_page_element else 1  # type: ignore
+        extract = {
+            "filmmaker": self._extract_filmmaker_works,
+            "writer": self._extract_writer_works,
+            "musician": self._extract_musician_works,
+        }[type]
+        creations = soup.select("ul.creations li.creation")
+        return total_page, [extract(creation) for creation in creations]
+
+    @staticmethod
+    def total_pages(html: str) -> int:
+        """不构建文档树，直接从页面中读出总页数"""
+        match = re.search(r"data-total-page=[\"']?(\d+)", html)
+        return int(match.group(1)) if match else 1
+
+    def archived_person_html(self) -> Optional[str]:
+        """requirement_1 抓取并归档过的人物主页，没有归档时返回 None"""
+        archive = self.client.archive
+        page = archive.latest(self.douban_url) if archive is not None else None
+        return page.text if page is not None and page.status == 200 else None
+
+    @staticmethod
+    def plan_types(
+        person_html: Optional[str] = None, works_count: Optional[str] = None
+    ) -> tuple[WorkType, ...]:
+        """
+        根据人物主页上的作品链接和 requirement_1 记录的影视作品数，返回需要请求的作品类型。
+        影视作品以作品数为准，图书和音乐以主页上的作品链接为准；信息缺失时按有作品处理，仍然请求。
+        """
+        linked = (
+            set(
+                re.findall(
+                    r"creations\?[^\"'>]*type=(filmmaker|writer|musician)", person_html
+                )
+            )
+            if person_html
+            else set()
+        )
+        types = []
+        for type in WORK_TYPES:
+            if type == "filmmaker":
+                # 影视作品以 requirement_1 的计数为准
+                if works_count is None or not works_count.isdigit():
+                    types.append(type)
+                elif int(works_count) > 0:
+                    types.append(type)
+            elif not linked or type in linked:
+                types.append(type)
+        return tuple(types)
+
+    def _fetch_type_pages(
+        self, type: Literal["filmmaker", "writer", "musician"]
+    ) -> list[str]:
+        """请求第一页得到总页数后，同时请求剩余页，按页码顺序返回各页 html"""
+        html = self._get_douban_works_html(start_page=0, type=type)
+        return [html] + fetch_pages(
+            lambda page: self._get_douban_works_html(start_page=page, type=type),
+            range(1, self.total_pages(html)),
+        )
+
+    def fetch_raw(
+        self, types: tuple[WorkType, ...] = WORK_TYPES
+    ) -> dict[str, list[str]]:
+        """按类型抓取全部作品页，返回 类型 -> 各页 html"""
+        return {type: self._fetch_type_pages(type) for type in types}
+
+    def parse_raw(self, raw: dict[str, list[str]]) -> List[DoubanWork]:
+        works: List[DoubanWork] = []
+        for type, pages in raw.items():
+            for html in pages:
+                works.extend(self.parse_works_page(html, type)[1])  # type: ignore
+        return works
+
+    def get_all_works_list(
+        self, type: Literal["filmmaker", "writer", "musician"]
+    ) -> List[DoubanWork]:
+        return self.parse_raw({type: self._fetch_type_pages(type)})
 
     def _extract_filmmaker_works(self, creation: Tag):
         work = DoubanWork(**{"douban_person_id": self.douban_person_id})
@@ -129,30 +201,8 @@ class DoubanWorkScraper:
             )
         return work
 
-    def get_all_filmmaker_list(self, seconds: int = 2) -> List[DoubanWork]:
-        soup = self._get_douban_works_html(start_page=0, type="filmmaker")
-        results = []
-        # 总页数
-        total_page_element = soup.select_one(".thispage")
-        total_page = int(total_page_element.attrs.get("data-total-page")) if total_page_element else "1"  # type: ignore
-        # 剩下的页数
-        page_list = [i for i in range(1, int(total_page))]
-        # 先搞定一页
-        creations = soup.select("ul.creations li.creation")
-        for creation in creations:
-            work = self._extract_filmmaker_works(creation)
-            results.append(work)
-        # 剩余页码
-        if len(page_list) == 0:
-            return results
-        for page in page_list:
-            soup = self._get_douban_works_html(start_page=page, type="filmmaker")
-            creations = soup.select("ul.creations li.creation")
-            for creation in creations:
-                work = self._extract_filmmaker_works(creation)
-                results.append(work)
-            time.sleep(seconds)
-        return results
+    def get_all_filmmaker_list(self) -> List[DoubanWork]:
+        return self.get_all_works_list("filmmaker")
 
     def _extract_writer_works(self, creation: Tag):
         work = DoubanWork(**{"douban_person_id": self.douban_person_id})
@@ -190,30 +240,8 @@ class DoubanWorkScraper:
             )
         return work
 
-    def get_all_writer_list(self, seconds: int = 2) -> List[DoubanWork]:
-        soup = self._get_douban_works_html(start_page=0, type="writer")
-        results = []
-        # 总页数
-        total_page_element = soup.select_one(".thispage")
-        total_page = int(total_page_element.attrs.get("data-total-page")) if total_page_element else "1"  # type: ignore
-        # 剩下的页数
-        page_list = [i for i in range(1, int(total_page))]
-        # 先搞定一页
-        creations = soup.select("ul.creations li.creation")
-        for creation in creations:
-            work = self._extract_writer_works(creation)
-            results.append(work)
-        # 剩余页码
-        if len(page_list) == 0:
-            return results
-        for page in page_list:
-            soup = self._get_douban_works_html(start_page=page, type="writer")
-            creations = soup.select("ul.creations li.creation")
-            for creation in creations:
-                work = self._extract_writer_works(creation)
-                results.append(work)
-            time.sleep(seconds)
-        return results
+    def get_all_writer_list(self) -> List[DoubanWork]:
+        return self.get_all_works_list("writer")
 
     def _extract_musician_works(self, creation: Tag):
         work = DoubanWork(**{"douban_person_id": self.douban_person_id})
@@ -246,30 +274,8 @@ class DoubanWorkScraper:
             )
         return work
 
-    def get_all_musician_list(self, seconds: int = 2) -> List[DoubanWork]:
-        soup = self._get_douban_works_html(start_page=0, type="musician")
-        results = []
-        # 总页数
-        total_page_element = soup.select_one(".thispage")
-        total_page = int(total_page_element.attrs.get("data-total-page")) if total_page_element else "1"  # type: ignore
-        # 剩下的页数
-        page_list = [i for i in range(1, int(total_page))]
-        # 先搞定一页
-        creations = soup.select("ul.creations li.creation")
-        for creation in creations:
-            work = self._extract_musician_works(creation)
-            results.append(work)
-        # 剩余页码
-        if len(page_list) == 0:
-            return results
-        for page in page_list:
-            soup = self._get_douban_works_html(start_page=page, type="musician")
-            creations = soup.select("ul.creations li.creation")
-            for creation in creations:
-                work = self._extract_musician_works(creation)
-                results.append(work)
-            time.sleep(seconds)
-        return results
+    def get_all_musician_list(self) -> List[DoubanWork]:
+        return self.get_all_works_list("musician")
 
 
 if __name__ == "__main__":
@@ -1,17 +1,25 @@
 import re
 import time
-import requests
-from bs4 import BeautifulSoup, Tag, ResultSet
-from typing import Any, Callable, List, Union
+from bs4 import BeautifulSoup, NavigableString, Tag, ResultSet
+from typing import Any, Callable, List, NamedTuple, Union
 from pydantic import BaseModel, Field
 from typing import Optional, Literal
-from retry import retry
 from db.schemas import MovieCreate, BookCreate, MusicCreate
-from lxml import etree
+from douban.base import BaseScraper
+from douban.html_parser import parse_html
 import utils
 
 
-class DoubanSubjectScraper:
+class InfoField(NamedTuple):
+    text: str
+    links: list[tuple[str, str]]
+
+
+def _info_field(texts: list[str], links: list[tuple[str, str]]) -> InfoField:
+    return InfoField("".join(texts).strip().lstrip(":：").strip(), links)
+
+
+class DoubanSubjectScraper(BaseScraper):
 
     def __init__(
         self,
@@ -19,30 +27,13 @@ class DoubanSubjectScraper:
         type: Literal["movie", "book", "music"],
         proxy_url: str | None = None,
     ):
+        super().__init__(proxy_url)
         self.douban_subject_id = douban_subject_id
         self.type = type
         self.subject_url = f"https://{type}.douban.com/subject/{douban_subject_id}/"
-        self.headers = {
-            "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
-            "accept-language": "zh-CN,zh;q=0.9,en;q=0.8,en-GB;q=0.7,en-US;q=0.6",
-            "priority": "u=0, i",
-            "sec-ch-ua": '"Microsoft Edge";v="131", "Chromium";v="131", "Not_A Brand";v="24"',
-            "sec-ch-ua-mobile": "?0",
-            "sec-ch-ua-platform": '"Windows"',
-            "sec-fetch-dest": "document",
-            "sec-fetch-mode": "navigate",
-            "sec-fetch-site": "same-origin",
-            "sec-fetch-user": "?1",
-            "upgrade-insecure-requests": "1",
-            "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36 Edg/131.0.0.0",
-        }
-        self.proxies = {"http": proxy_url, "https": proxy_url} if proxy_url else None
 
-    @retry(tries=3, delay=2, backoff=2, max_delay=10, jitter=(1, 3))
     def _get_html(self):
-        response = requests.get(
-            self.subject_url, headers=self.headers, proxies=self.proxies
-        )
+        response = self._get(self.subject_url)
         response.raise_for_status()
         html = response.text
         return html
@@ -56,9 +47,25 @@ class DoubanSubjectScraper:
         # 根据 self.type 调用对应的函数并返回结果
         return map[self.type]()
 
+    def fetch_raw(self) -> str:
+        return self._get_html()
+
+    def parse_raw(self, raw: str) -> Union[MovieCreate, BookCreate, MusicCreate]:
+        return self.parse_subject(raw)
+
+    def parse_subject(self, html: str) -> Union[MovieCreate, BookCreate, MusicCreate]:
+        map = {
+            "movie": self.parse_movie,
+            "book": self.parse_book,
+            "music": self.parse_music,
+        }
+        return map[self.type](html)
+
     def _get_subject_movie(self) -> MovieCreate:
-        html = self._get_html()
-        soup = BeautifulSoup(html, "html.parser")
+        return self.parse_movie(self._get_html())
+
+    def parse_movie(self, html: str) -> MovieCreate:
+        soup = parse_html(html)
         new_subject = MovieCreate()
         new_subject.title = (
             element.text
@@ -73,60 +80,18 @@ class DoubanSubjectScraper:
             is not None
             else None
         )
-        new_subject.director = (
-            element.text
-            if (element := soup.select_one(".attrs a")) is not None
-            else None
-        )
-        new_subject.director_url = (
-            element.attrs.get("href")
-            if (element := soup.select_one(".attrs a")) is not None
-            else None
-        )
-        screenwriter_span = soup.find("span", class_="pl", string="编剧")
-        if screenwriter_span is not None:
-            screenwriter_attrs_span = screenwriter_span.find_next_sibling(
-                "span", class_="attrs"
-            )
-            if screenwriter_attrs_span is not None:
-                screenwriter_attrs_a = screenwriter_attrs_span.find_all("a")  # type: ignore
-                new_subject.screenwriter = [a.text for a in screenwriter_attrs_a]
-                new_subject.screenwriter_url = [
-                    a.attrs.get("href", "") for a in screenwriter_attrs_a
-                ]
-        starring_span = soup.find("span", class_="pl", string="主演")
-        if starring_span is not None:
-            starring_attrs_span = starring_span.find_next_sibling(
-                "span", class_="attrs"
-            )
-            if starring_attrs_span is not None:
-                screenwriter_attrs_a = starring_attrs_span.find_all("a")  # type: ignore
-                new_subject.starring = [a.text for a in screenwriter_attrs_a]
-                new_subject.starring_url = [
-                    a.attrs.get("href", "") for a in screenwriter_attrs_a
-                ]
-
-        type_span = soup.find("span", class_="pl", string="类型:")
-        new_subject.genre = []
-        if type_span is not None:
-            for sibling in type_span.find_next_siblings("span", property="v:genre"):
-                new_subject.genre.append(sibling.text)
-        country_span = soup.find("span", class_="pl", string="制片国家/地区:")
-        if country_span:
-            # 获取 <span> 标签后面的文本
-            new_subject.country = (
-                elemnet.text.strip()
-                if (elemnet := country_span.next_sibling) is not None
-                else None
-            )
-        language_span = soup.find("span", class_="pl", string="语言:")
-        if language_span:
-            # 获取 <span> 标签后面的文本
-            new_subject.language = (
-                elemnet.text.strip()
-                if (elemnet := language_span.next_sibling) is not None
-                else None
-            )
+        info = self._parse_info(soup)
+        new_subject.director, new_subject.director_url = self._info_link(info, "导演")
+        if "编剧" in info:
+            new_subject.screenwriter = [text for text, _ in info["编剧"].links]
+            new_subject.screenwriter_url = [href for _, href in info["编剧"].links]
+        if "主演" in info:
+            new_subject.starring = [text for text, _ in info["主演"].links]
+            new_subject.starring_url = [href for _, href in info["主演"].links]
+        genre = self._info_text(info, "类型")
+        new_subject.genre = genre.split(" / ") if genre else []
+        new_subject.country = self._info_text(info, "制片国家/地区")
+        new_subject.language = self._info_text(info, "语言")
         release_date_elements = soup.find_all(property="v:initialReleaseDate")
         new_subject.release_date = [
             element.text.strip() for element in release_date_elements
@@ -136,34 +101,10 @@ class DoubanSubjectScraper:
             if (element := soup.find("span", property="v:runtime")) is not None
             else None
         )
-        episodes_span = soup.find("span", class_="pl", string="集数:")
-        if episodes_span is not None:
-            new_subject.episodes = (
-                element.text.strip()
-                if (element := episodes_span.next_sibling) is not None
-                else None
-            )
-        episode_runtime_span = soup.find("span", class_="pl", string="单集片长:")
-        if episode_runtime_span is not None:
-            new_subject.episode_runtime = (
-                element.text.strip()
-                if (element := episode_runtime_span.next_sibling) is not None
-                else None
-            )
-        aka_span = soup.find("span", class_="pl", string="又名:")
-        if aka_span is not None:
-            new_subject.aka = (
-                element.text.strip()
-                if (element := aka_span.next_sibling) is not None
-                else None
-            )
-        imdb_span = soup.find("span", class_="pl", string="IMDb:")
-        if imdb_span is not None:
-            new_subject.imdb = (
-                element.text.strip()
-                if (element := imdb_span.next_sibling) is not None
-                else None
-            )
+        new_subject.episodes = self._info_text(info, "集数")
+        new_subject.episode_runtime = self._info_text(info, "单集片长")
+        new_subject.aka = self._info_text(info, "又名")
+        new_subject.imdb = self._info_text(info, "IMDb")
         new_subject.synopsis = (
             element.text.strip()
             if (element := soup.find("span", property="v:summary")) is not None
@@ -288,68 +229,86 @@ class DoubanSubjectScraper:
             new_subject.question_url = f"{self.subject_url}questions/?from=subject"
         return new_subject
 
-    def _get_next_a(self, soup: BeautifulSoup, key: str):
-        try:
-            tag = soup.find("span", string=key).find_next("a")  # type: ignore
-            return (
-                (tag.text, tag.attrs.get("href"))
-                if isinstance(tag, Tag)
-                else (None, None)
-            )
-        except AttributeError:
-            return (None, None)
+    def _parse_info(self, soup: BeautifulSoup) -> dict[str, InfoField]:
+        """
+        单次遍历 #info，以 span.pl 标签开始、<br> 结束切分出每一项，
+        返回 标签 -> (文本, [(链接文本, 链接)])。
+        标签取冒号之前的部分并去掉首尾空白，文本去掉开头的冒号和首尾空白。
+        """
+        fields: dict[str, InfoField] = {}
+        info = soup.find("div", id="info")
+        if not isinstance(info, Tag):
+            return fields
+        label, label_tag, texts, links = None, None, [], []
+        for element in info.descendants:
+            if isinstance(element, Tag):
+                if element.name == "span" and "pl" in element.get("class", []):
+                    if label is not None:
+                        fields.setdefault(label, _info_field(texts, links))
+                    # 部分页面的链接写在标签内，如 <span class="pl">表演者: <a>..</a></span>
+                    label = re.split(r"[:：]", element.get_text(), maxsplit=1)[
+                        0
+                    ].strip()
+                    label_tag = element
+                    texts, links = [], []
+                elif element.name == "br":
+                    if label is not None:
+                        fields.setdefault(label, _info_field(texts, links))
+                    label = None
+                elif element.name == "a" and label is not None:
+                    links.append(
+                        (element.get_text().strip(), element.attrs.get("href", ""))
+                    )
+            elif type(element) is NavigableString and label is not None:
+                text = str(element)
+                if element.parent is label_tag:
+                    # 标签本身的文字只保留冒号之后的部分
+                    parts = re.split(r"[:：]", text, maxsplit=1)
+                    text = parts[1] if len(parts) > 1 else ""
+                texts.append(text)
+        if label is not None:
+            fields.setdefault(label, _info_field(texts, links))
+        return fields
 
-    def _get_next_text(self, soup: BeautifulSoup, key: str):
-        try:
-            tag = soup.find("span", string=key)  # type: ignore
-            if not isinstance(tag, Tag):
-                return None
-            if tag.next_sibling is None:
-                return None
-            return tag.next_sibling.text.strip()
-        except AttributeError:
-            return None
+    def _info_text(self, info: dict[str, InfoField], key: str) -> Optional[str]:
+        return info[key].text if key in info else None
+
+    def _info_link(self, info: dict[str, InfoField], key: str):
+        if key not in info or not info[key].links:
+            return (None, None)
+        return info[key].links[0]
 
     def _get_subject_book(self) -> BookCreate:
+        return self.parse_book(self._get_html())
+
+    def parse_book(self, html: str) -> BookCreate:
         new_subject = BookCreate()
-        html = self._get_html()
-        soup = BeautifulSoup(html, "html.parser")
+        soup = parse_html(html)
         new_subject.title = (
             element.text
             if (element := soup.find("span", property="v:itemreviewed")) is not None
             else None
         )
-        try:
-            new_subject.subject_url = self.subject_url
-            author_a_list = soup.find("div", id="info").find("span").find_all("a")  # type: ignore
-            new_subject.author = [a.text for a in author_a_list]
+        new_subject.subject_url = self.subject_url
+        info = self._parse_info(soup)
+        if "作者" in info:
+            new_subject.author = [text for text, _ in info["作者"].links]
             new_subject.author_url = [
-                "https://book.douban.com" + a.attrs.get("href") for a in author_a_list
+                "https://book.douban.com" + href for _, href in info["作者"].links
             ]
-        except AttributeError:
-            pass
-
-        new_subject.publisher, new_subject.publisher_url = self._get_next_a(
-            soup, "出版社:"
-        )
-
-        new_subject.producer, new_subject.producer_url = self._get_next_a(
-            soup, "出品方:"
+        new_subject.publisher, new_subject.publisher_url = self._info_link(
+            info, "出版社"
         )
-        try:
-            new_subject.original_title = soup.find(
-                "span", class_="pl", string="原作名:"
-            ).next_sibling.text.strip()  # type: ignore
-        except AttributeError:
-            pass
-        new_subject.translator, new_subject.translator_url = self._get_next_a(
-            soup, " 译者"
+        new_subject.producer, new_subject.producer_url = self._info_link(info, "出品方")
+        new_subject.original_title = self._info_text(info, "原作名")
+        new_subject.translator, new_subject.translator_url = self._info_link(
+            info, "译者"
         )
-        new_subject.publication_year = self._get_next_text(soup, "出版年:")
-        new_subject.pages = self._get_next_text(soup, "页数:")
-        new_subject.binding = self._get_next_text(soup, "装帧:")
-        new_subject.series, new_subject.series_url = self._get_next_a(soup, "丛书:")
-        new_subject.isbn = self._get_next_text(soup, "ISBN:")
+        new_subject.publication_year = self._info_text(info, "出版年")
+        new_subject.pages = self._info_text(info, "页数")
+        new_subject.binding = self._info_text(info, "装帧")
+        new_subject.series, new_subject.series_url = self._info_link(info, "丛书")
+        new_subject.isbn = self._info_text(info, "ISBN")
         new_subject.synopsis = "".join(soup.find("span", class_="all hidden").text.split())  # type: ignore
         try:
             new_subject.author_intro = soup.find("p", string="【编者简介】").find_next("p").text.strip()  # type: ignore
@@ -451,42 +410,39 @@ class DoubanSubjectScraper:
         new_subject.reading_note_url = f"{self.subject_url}annotation"
         return new_subject
 
-    def _get_subject_music(self):
+    def _get_subject_music(self) -> MusicCreate:
+        return self.parse_music(self._get_html())
+
+    def parse_music(self, html: str) -> MusicCreate:
         new_subject = MusicCreate()
-        html = self._get_html()
-        soup = BeautifulSoup(html, "html.parser")
+        soup = parse_html(html)
         new_subject.title = (
             element.text
             if (element := soup.select_one("#wrapper > h1 > span")) is not None
             else None
         )
         new_subject.subject_url = self.subject_url
-        new_subject.aka = self._get_next_text(soup, "又名:")
-        performer_a_list = soup.select("#info > span:nth-child(3) > span a")
-        new_subject.performer = (
-            [performer_a.text for performer_a in performer_a_list]
-            if performer_a_list
-            else None
-        )
+        info = self._parse_info(soup)
+        new_subject.aka = self._info_text(info, "又名")
+        performers = info["表演者"].links if "表演者" in info else []
+        new_subject.performer = [text for text, _ in performers] if performers else None
         new_subject.performer_url = (
-            [performer_a.attrs.get("href", "") for performer_a in performer_a_list]
-            if performer_a_list
-            else None
+            [href for _, href in performers] if performers else None
         )
-        new_subject.genre = self._get_next_text(soup, "流派:")
-        new_subject.album_type = self._get_next_text(soup, "专辑类型:")
-        new_subject.medium = self._get_next_text(soup, "介质:")
-        new_subject.release_date = self._get_next_text(soup, "发行时间:")
-        new_subject.publisher = self._get_next_text(soup, "出版者:")
-        new_subject.disc_count = self._get_next_text(soup, "唱片数:")
-        new_subject.barcode = self._get_next_text(soup, "条形码:")
+        new_subject.genre = self._info_text(info, "流派")
+        new_subject.album_type = self._info_text(info, "专辑类型")
+        new_subject.medium = self._info_text(info, "介质")
+        new_subject.release_date = self._info_text(info, "发行时间")
+        new_subject.publisher = self._info_text(info, "出版者")
+        new_subject.disc_count = self._info_text(info, "唱片数")
+        new_subject.barcode = self._info_text(info, "条形码")
         new_subject.douban_rating = (
             element.text.strip()
             if (element := soup.find("strong", property="v:average")) is not None
             else None
         )
-        new_subject.related_movie, new_subject.related_movie_url = self._get_next_a(
-            soup, "相关电影:"
+        new_subject.related_movie, new_subject.related_movie_url = self._info_link(
+            info, "相关电影"
         )
         new_subject.synopsis = "".join(soup.find("span", class_="all hidden").text.split())  # type: ignore
         track_li_list = soup.select(".track-items.indent li")
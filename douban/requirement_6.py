@@ -1,11 +1,11 @@
 import time
-import requests
 from bs4 import BeautifulSoup, Tag, ResultSet
 from typing import Any, List
 from pydantic import BaseModel, Field
 from typing import Optional, Literal
-from retry import retry
 from db.schemas import CastCreate
+from douban.base import BaseScraper
+from douban.html_parser import parse_html
 import utils
 
 
@@ -13,7 +13,7 @@ class Cast(CastCreate):
     pass
 
 
-class DoubanCastScraper:
+class DoubanCastScraper(BaseScraper):
 
     def __init__(
         self,
@@ -21,40 +21,30 @@ class DoubanCastScraper:
         proxy_url: str | None = None,
         type: Literal["movie"] = "movie",
     ):
+        super().__init__(proxy_url)
         self.douban_subject_id = douban_subject_id
         self.type = type
         self.subject_url = f"https://{type}.douban.com/subject/{douban_subject_id}/"
         self.cast_url = f"{self.subject_url}celebrities"
-        self.headers = {
-            "accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
-            "accept-language": "zh-CN,zh;q=0.9,en;q=0.8,en-GB;q=0.7,en-US;q=0.6",
-            "priority": "u=0, i",
-            "sec-ch-ua": '"Microsoft Edge";v="131", "Chromium";v="131", "Not_A Brand";v="24"',
-            "sec-ch-ua-mobile": "?0",
-            "sec-ch-ua-platform": '"Windows"',
-            "sec-fetch-dest": "document",
-            "sec-fetch-mode": "navigate",
-            "sec-fetch-site": "same-origin",
-            "sec-fetch-user": "?1",
-            "upgrade-insecure-requests": "1",
-            "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36 Edg/131.0.0.0",
-        }
-        self.proxies = {"http": proxy_url, "https": proxy_url} if proxy_url else None
 
-    @retry(tries=3, delay=2, backoff=2, max_delay=10, jitter=(1, 3))
     def _get_html(self):
-        response = requests.get(
-            self.cast_url, headers=self.headers, proxies=self.proxies
-        )
+        response = self._get(self.cast_url)
         response.raise_for_status()
         html = response.text
         return html
 
     def get_data(self):
+        return self.parse(self._get_html())
+
+    def fetch_raw(self) -> str:
+        return self._get_html()
+
+    def parse_raw(self, raw: str) -> List[Cast]:
+        return self.parse(raw)
 
+    def parse(self, html: str) -> List[Cast]:
         data: List[Cast] = []
-        html = self._get_html()
-        soup = BeautifulSoup(html, "html.parser")
+        soup = parse_html(html)
         douban_subject_id = self.douban_subject_id
         title_tag = soup.select_one("#content > h1")
         title = (
@@ -1,30 +1,24 @@
-import pandas as pd
 from db import models, database, schemas
+from db.bulk import bulk_load
 from log import init_logger
-import logging
+from utils import iter_excel_column
 
 init_logger("load_data_person")
 person_urls_data_path = "./data/person_urls.xlsx"
+# 每块读取和写入的行数
+CHUNK_SIZE = 10000
 
 
-df = pd.read_excel(person_urls_data_path)
-urls = df["豆瓣ID"].tolist()
+def to_rows(urls: list[str]) -> list[dict]:
+    return [
+        schemas.MarkingCreate(douban_person_id=str(url.split("/")[-2])).model_dump()
+        for url in urls
+    ]
+
 
 db = database.SessionLocal()
 
-for url in urls:
-    id = str(url.split("/")[-2])
-    if (
-        db.query(models.Marking).filter(models.Marking.douban_person_id == id).first()
-        is not None
-    ):
-        logging.warning(f"{id} already exists")
-        continue
-    new_marking = models.Marking(
-        **(schemas.MarkingCreate(douban_person_id=id).model_dump())
-    )
-    db.add(new_marking)
-    db.commit()
-    logging.info(f"{id} added")
+chunks = iter_excel_column(person_urls_data_path, "豆瓣ID", CHUNK_SIZE)
+bulk_load(db, models.Marking, (to_rows(urls) for urls in chunks))
 
 db.close()
@@ -1,38 +1,33 @@
-import pandas as pd
 from db import models, database, schemas
+from db.bulk import bulk_load
 from log import init_logger
-import logging
+from utils import iter_csv_column
 
 init_logger("load_data_subject")
 urls_data_path = "./data/subject_urls.csv"
+# 每块读取和写入的行数
+CHUNK_SIZE = 10000
 
 
-df = pd.read_csv(urls_data_path)
-urls = df["work_url"].tolist()
+def to_rows(urls: list[str]) -> list[dict]:
+    rows = []
+    for url in urls:
+        id = str(url.split("/")[-2])
+        if "movie" in url:
+            type = "movie"
+        elif "book" in url:
+            type = "book"
+        else:
+            type = "music"
+        rows.append(
+            schemas.SubjectMarkingCreate(douban_subject_id=id, type=type).model_dump()
+        )
+    return rows
+
 
 db = database.SessionLocal()
 
-for url in urls:
-    id = str(url.split("/")[-2])
-    if "movie" in url:
-        type = "movie"
-    elif "book" in url:
-        type = "book"
-    else:
-        type = "music"
-    if (
-        db.query(models.SubjectMarking)
-        .filter(models.SubjectMarking.douban_subject_id == id)
-        .first()
-        is not None
-    ):
-        logging.warning(f"{id} already exists")
-        continue
-    new_marking = models.SubjectMarking(
-        **(schemas.SubjectMarkingCreate(douban_subject_id=id, type=type).model_dump())
-    )
-    db.add(new_marking)
-    db.commit()
-    logging.info(f"{id} added")
+chunks = iter_csv_column(urls_data_path, "work_url", CHUNK_SIZE)
+bulk_load(db, models.SubjectMarking, (to_rows(urls) for urls in chunks))
 
 db.close()
@@ -0,0 +1,151 @@
+import logging
+import threading
+import time
+from typing import Optional
+
+# 视为出口 IP 被封禁的状态码
+BAN_STATUS = {403, 418, 429}
+# 每个代理同时在途的请求数
+PROXY_MAX_INFLIGHT = 4
+# 连续失败多少次后隔离
+FAILURE_THRESHOLD = 3
+# 首次隔离的秒数，再次失败时加倍，最长 QUARANTINE_MAX_SECONDS
+QUARANTINE_SECONDS = 60
+QUARANTINE_MAX_SECONDS = 3600
+# 成功率和耗时的滑动平均系数
+EWMA_ALPHA = 0.2
+
+
+class ProxyState:
+    """单个代理的健康状态"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.inflight = 0
+        # 未使用过的代理按又快又稳处理，保证每个代理都会被试用
+        self.success_rate = 1.0
+        self.latency = 0.0
+        self.failures = 0
+        self.quarantine_seconds = QUARANTINE_SECONDS
+        self.quarantined_until = 0.0
+        # 隔离到期后先只放一个请求试探，成功才恢复
+        self.probing = False
+
+    @property
+    def score(self) -> float:
+        return self.success_rate / max(self.latency, 0.05)
+
+    def available(self, now: float, max_inflight: int) -> bool:
+        if self.quarantined_until > now:
+            return False
+        if self.probing:
+            return self.inflight == 0
+        return self.inflight < max_inflight
+
+
+class ProxyPool:
+    """
+    代理池。每次请求选择当前可用代理中得分（成功率 / 平均耗时）最高的一个，
+    每个代理同时在途的请求数不超过 max_inflight。
+    返回封禁状态码时立即隔离，连接失败连续 failure_threshold 次时隔离；
+    隔离到期后先放一个请求试探，成功则恢复，失败则隔离时间加倍。
+    """
+
+    def __init__(
+        self,
+        proxy_urls: list[str],
+        max_inflight: int = PROXY_MAX_INFLIGHT,
+        failure_threshold: int = FAILURE_THRESHOLD,
+    ):
+        if not proxy_urls:
+            raise ValueError("ProxyPool requires at least one proxy.")
+        self.proxies = {url: ProxyState(url) for url in dict.fromkeys(proxy_urls)}
+        self.max_inflight = max_inflight
+        self.failure_threshold = failure_threshold
+        self._cond = threading.Condition()
+
+    def _pick(self, now: float) -> Optional[ProxyState]:
+        candidates = [
+            proxy
+            for proxy in self.proxies.values()
+            if proxy.available(now, self.max_inflight)
+        ]
+        if not candidates:
+            return None
+        # 隔离到期的代理优先试探，得分相同时优先选在途请求少的
+        return max(
+            candidates,
+            key=lambda proxy: (proxy.probing, proxy.score, -proxy.inflight),
+        )
+
+    def acquire(self) -> str:
+        """阻塞直到有可用的代理，返回代理地址"""
+        with self._cond:
+            while True:
+                now = time.time()
+                proxy = self._pick(now)
+                if proxy is not None:
+                    proxy.inflight += 1
+                    return proxy.url
+                # 全部被隔离或占满时，等到最早的隔离到期或有请求完成
+                until = min(
+                    (
+                        p.quarantined_until
+                        for p in self.proxies.values()
+                        if p.quarantined_until > now
+                    ),
+                    default=now + 1,
+                )
+                self._cond.wait(max(until - now, 0.05))
+
+    def release(self, url: str, latency: float, status: Optional[int]):
+        """记录一次请求的结果，status 为 None 表示连接失败或超时"""
+        with self._cond:
+            proxy = self.proxies[url]
+            proxy.inflight -= 1
+            ok = status is not None and status not in BAN_STATUS and status < 500
+            proxy.success_rate += EWMA_ALPHA * (float(ok) - proxy.success_rate)
+            if ok:
+                proxy.latency += EWMA_ALPHA * (latency - proxy.latency)
+                proxy.failures = 0
+                if proxy.probing:
+                    proxy.probing = False
+                    proxy.quarantine_seconds = QUARANTINE_SECONDS
+                    logging.info(f"Proxy {url} recovered")
+            else:
+                proxy.failures += 1
+                # 已被隔离时，隔离前发出的请求陆续失败不再重复计算
+                if proxy.quarantined_until <= time.time() and (
+                    proxy.probing
+                    or status in BAN_STATUS
+                    or proxy.failures >= self.failure_threshold
+                ):
+                    self._quarantine(proxy, status)
+            self._cond.notify_all()
+
+    def _quarantine(self, proxy: ProxyState, status: Optional[int]):
+        if proxy.probing:
+            proxy.quarantine_seconds = min(
+                proxy.quarantine_seconds * 2, QUARANTINE_MAX_SECONDS
+            )
+        proxy.quarantined_until = time.time() + proxy.quarantine_seconds
+        proxy.probing = True
+        proxy.failures = 0
+        logging.warning(
+            f"Proxy {proxy.url} quarantined for {proxy.quarantine_seconds}s "
+            f"(status {status})"
+        )
+
+    def metrics(self) -> list[dict]:
+        with self._cond:
+            now = time.time()
+            return [
+                {
+                    "url": proxy.url,
+                    "inflight": proxy.inflight,
+                    "success_rate": round(proxy.success_rate, 3),
+                    "latency": round(proxy.latency, 3),
+                    "quarantined": proxy.quarantined_until > now,
+                }
+                for proxy in self.proxies.values()
+            ]
@@ -0,0 +1,132 @@
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+class RateLimiter:
+    """线程安全的令牌桶限速器，rate 为每秒令牌数，burst 为桶容量"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        if rate <= 0:
+            raise ValueError("Rate must be positive.")
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """取走一个令牌，返回需要等待的秒数（令牌可以预支，保证先到先得）"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated_at) * self.rate
+            )
+            self._updated_at = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        """阻塞直到拿到一个令牌"""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+
+# 多进程共享的限速状态文件
+RATE_LIMIT_DB = "./rate_limit.db"
+# 每个 host 的 (每秒请求数, 桶容量)
+HOST_RATES: dict[str, tuple[float, int]] = {
+    "www.douban.com": (1.0, 2),
+    "movie.douban.com": (1.0, 2),
+    "book.douban.com": (1.0, 2),
+    "music.douban.com": (1.0, 2),
+    "m.douban.com": (2.0, 4),
+}
+# 未在 HOST_RATES 中配置的 host
+DEFAULT_HOST_RATE = (1.0, 2)
+
+
+class HostRateLimiter:
+    """
+    按 host 限速的令牌桶。桶的状态保存在 SQLite 中，每次取令牌都在一个写事务里完成，
+    因此同一台机器上的所有线程和进程共用同一组桶，合起来不会超过配置的速率。
+    """
+
+    def __init__(
+        self,
+        path: str = RATE_LIMIT_DB,
+        rates: Optional[dict[str, tuple[float, int]]] = None,
+        default: tuple[float, int] = DEFAULT_HOST_RATE,
+    ):
+        self.path = path
+        self.rates = HOST_RATES if rates is None else rates
+        self.default = default
+        for rate, _ in [*self.rates.values(), default]:
+            if rate <= 0:
+                raise ValueError("Rate must be positive.")
+        self._local = threading.local()
+        # 所有线程的连接，close() 时一起关闭
+        self._connections: list[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._db().execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            "host TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def _db(self) -> sqlite3.Connection:
+        """每个线程使用自己的连接，事务由 reserve 显式控制"""
+        db = getattr(self._local, "db", None)
+        if db is None:
+            # 只在创建它的线程中使用，允许 close() 在其他线程关闭
+            db = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None, check_same_thread=False
+            )
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+            with self._connections_lock:
+                self._connections.append(db)
+        return db
+
+    def reserve(self, host: str) -> float:
+        """取走 host 的一个令牌，返回需要等待的秒数（令牌可以预支，保证先到先得）"""
+        rate, burst = self.rates.get(host, self.default)
+        db = self._db()
+        # IMMEDIATE 事务开始时即持有写锁，其他进程的读改写只能排在后面
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute(
+                "SELECT tokens, updated_at FROM buckets WHERE host = ?", (host,)
+            ).fetchone()
+            now = time.time()
+            tokens = (
+                float(burst)
+                if row is None
+                else min(burst, row[0] + (now - row[1]) * rate)
+            ) - 1
+            db.execute(
+                "INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)", (host, tokens, now)
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return 0.0 if tokens >= 0 else -tokens / rate
+
+    def acquire(self, host: str):
+        """阻塞直到拿到 host 的一个令牌"""
+        wait = self.reserve(host)
+        if wait > 0:
+            time.sleep(wait)
+
+    def close(self):
+        """关闭所有线程的连接"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for db in connections:
+            db.close()
+        self._local = threading.local()
@@ -0,0 +1,199 @@
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from db import crud, database, models
+from db.schemas import BookCreate, MovieCreate, MusicCreate
+from douban.archive import ARCHIVE_DIR
+from douban.offline import init_worker, reparse_task
+from log import init_logger
+
+
+def _save_subject(db, subject, commit: bool = True):
+    create = {
+        MovieCreate: crud.create_movie,
+        BookCreate: crud.create_book,
+        MusicCreate: crud.create_music,
+    }[type(subject)]
+    create(db, subject, commit=commit)
+
+
+def _subject_url(task_id: str, type: Optional[str]) -> str:
+    return f"https://{type or 'movie'}.douban.com/subject/{task_id}/"
+
+
+# requirement -> (入库函数, 删除旧结果的条件)
+TABLES = {
+    "requirement_1": (
+        crud.create_douban_person,
+        lambda id, type: [
+            (models.DoubanPerson, models.DoubanPerson.douban_person_id == id)
+        ],
+    ),
+    "requirement_2": (
+        crud.create_douban_works_mutil,
+        lambda id, type: [
+            (models.DoubanWork, models.DoubanWork.douban_person_id == id)
+        ],
+    ),
+    "requirement_3": (
+        crud.create_award_info_mutil,
+        lambda id, type: [(models.AwardInfo, models.AwardInfo.douban_person_id == id)],
+    ),
+    "requirement_4": (
+        crud.create_collaborations_mutil,
+        lambda id, type: [
+            (models.CollaborationInfo, models.CollaborationInfo.douban_person_id == id)
+        ],
+    ),
+    "requirement_5": (
+        _save_subject,
+        lambda id, type: [
+            (model, model.subject_url == _subject_url(id, type))
+            for model in (models.Movie, models.Book, models.Music)
+        ],
+    ),
+    "requirement_6": (
+        crud.create_casts_mutil,
+        lambda id, type: [(models.Cast, models.Cast.douban_subject_id == id)],
+    ),
+    "requirement_7": (
+        crud.create_subject_awards_mutil,
+        lambda id, type: [
+            (
+                models.SubjectAward,
+                models.SubjectAward.award_url == _subject_url(id, type) + "awards/",
+            )
+        ],
+    ),
+}
+
+
+def _tasks(db, requirement: str) -> list[tuple[str, Optional[str]]]:
+    """需要重新解析的任务：标记表中的全部人物或作品"""
+    if requirement in (
+        "requirement_1",
+        "requirement_2",
+        "requirement_3",
+        "requirement_4",
+    ):
+        return [(row[0], None) for row in db.query(models.Marking.douban_person_id)]
+    query = db.query(
+        models.SubjectMarking.douban_subject_id, models.SubjectMarking.type
+    )
+    if requirement != "requirement_5":
+        # 演职员和获奖信息只有电影才有
+        query = query.filter(models.SubjectMarking.type == "movie")
+    return [(row[0], row[1]) for row in query]
+
+
+def _mark_finished(db, requirement: str, ids: list[str]):
+    if requirement in (
+        "requirement_1",
+        "requirement_2",
+        "requirement_3",
+        "requirement_4",
+    ):
+        model, key = models.Marking, models.Marking.douban_person_id
+    else:
+        model, key = models.SubjectMarking, models.SubjectMarking.douban_subject_id
+    db.query(model).filter(key.in_(ids)).update(
+        {
+            getattr(model, requirement): True,
+            getattr(model, f"{requirement}_claimed_by"): None,
+            getattr(model, f"{requirement}_lease_expires_at"): None,
+        },
+        synchronize_session=False,
+    )
+
+
+def reparse(
+    requirement: str,
+    workers: Optional[int] = None,
+    archive_dir: str = ARCHIVE_DIR,
+    batch_size: int = 500,
+    window: int = 10000,
+):
+    """
+    用归档中的页面重建 requirement 对应的结果表，不访问网络。
+    解析在进程池中进行；主进程按批删除旧结果、写入新结果并把任务标记为完成。
+    归档中缺少页面的任务保持原样。
+    """
+    save, conditions = TABLES[requirement]
+    db = database.SessionLocal()
+    tasks = _tasks(db, requirement)
+    logging.info(f"Reparsing {len(tasks)} tasks for {requirement}")
+    start_time = time.time()
+    done = missing = failed = 0
+    batch: list[tuple[str, Optional[str], object]] = []
+
+    def flush():
+        for task_id, type, result in batch:
+            for model, condition in conditions(task_id, type):
+                db.query(model).filter(condition).delete(synchronize_session=False)
+            save(db, result, commit=False)
+        _mark_finished(db, requirement, [task_id for task_id, _, _ in batch])
+        db.commit()
+        batch.clear()
+
+    workers = workers or os.cpu_count() or 1
+    try:
+        with ProcessPoolExecutor(
+            workers, initializer=init_worker, initargs=(archive_dir,)
+        ) as pool:
+            # 分段提交，避免一次为全部任务创建 future
+            for i in range(0, len(tasks), window):
+                window_tasks = tasks[i : i + window]
+                results = pool.map(
+                    reparse_task,
+                    [requirement] * len(window_tasks),
+                    [task_id for task_id, _ in window_tasks],
+                    [type for _, type in window_tasks],
+                    chunksize=max(1, len(window_tasks) // (workers * 4)),
+                )
+                for task_id, type, result, error in results:
+                    if error == "missing":
+                        missing += 1
+                        continue
+                    if error is not None:
+                        failed += 1
+                        logging.error(
+                            f"Error occurred while reparsing [{task_id}]: {error}"
+                        )
+                        continue
+                    batch.append((task_id, type, result))
+                    done += 1
+                    if len(batch) >= batch_size:
+                        flush()
+                        logging.info(
+                            f"Reparsed {done} tasks, {done / (time.time() - start_time):.0f} tasks/s"
+                        )
+        if batch:
+            flush()
+    finally:
+        db.close()
+    logging.info(
+        f"Reparsed {done} tasks for {requirement} in {time.time() - start_time:.2f} seconds, "
+        f"{missing} not archived, {failed} failed"
+    )
+
+
+def main(
+    requirements: list[str],
+    workers: Optional[int] = None,
+    archive_dir: str = ARCHIVE_DIR,
+):
+    init_logger("reparse")
+    for requirement in requirements:
+        reparse(requirement, workers, archive_dir)
+
+
+if __name__ == "__main__":
+    # 配置选项
+    # 需要重建的采集任务
+    REQUIREMENTS = ["requirement_5", "requirement_6", "requirement_7"]
+    # 解析进程数，None 表示使用全部 CPU
+    WORKERS = None
+    main(REQUIREMENTS, WORKERS, ARCHIVE_DIR)
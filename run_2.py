@@ -1,79 +1,194 @@
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import time
+from datetime import datetime, timedelta
+from functools import partial
 from pydantic import BaseModel
 from db import crud, database, schemas
-from douban.requirement_2 import DoubanWorkScraper
+from douban.requirement_2 import WORK_TYPES, DoubanWorkScraper
 from log import init_logger
-from sqlalchemy.orm import Session
-from cookies_manager import CookieRotator
+from scheduler import TaskScheduler
+from circuit_breaker import (
+    CircuitBreakers,
+    CircuitOpenError,
+    error_name,
+    is_permanent,
+)
+from concurrency import AIMDController
+from douban import client
+from db.writer import DBWriter
+from douban.parse_pool import ParsePool
+from cookies_manager import CookiePool, CookieUnavailableError
 
 
 def scrape_task(
     task: schemas.Marking,
-    db: Session,
-    rotator: CookieRotator,
+    writer: DBWriter,
+    parser: ParsePool,
+    cookie_pool: CookiePool,
     proxy_url: str | None = None,
-    every_times_sleep: int = 2,
+    works_count: str | None = None,
 ):
     logging.info(f"Scraping [{task.douban_person_id}] -- requirement_2 ")
     scraper = DoubanWorkScraper(
         task.douban_person_id,
-        rotator.get_next_cookie(),
+        {},
         proxy_url,
     )
+    # 只请求有作品的类型，节省需要登录的请求
+    types = scraper.plan_types(scraper.archived_person_html(), works_count)
+    if len(types) < len(WORK_TYPES):
+        logging.info(
+            f"Requesting {', '.join(types) or 'no'} works for [{task.douban_person_id}]"
+        )
+    # 没有需要请求的类型时不占用 cookie；每个类型至少请求第一页，翻页请求抓取后补扣
+    cookie = cookie_pool.acquire(len(types)) if types else None
+    scraper.cookies = cookie
     works: list[schemas.DoubanWorkCreate] = []
     try:
-        works.extend(scraper.get_all_filmmaker_list(every_times_sleep))
-        works.extend(scraper.get_all_musician_list(every_times_sleep))
-        works.extend(scraper.get_all_writer_list(every_times_sleep))
-        db_works = crud.create_douban_works_mutil(db, works)
-        logging.info(f"Scraped {len(db_works)} works for [{task.douban_person_id}]")
-        crud.change_marking_status(db, task.douban_person_id, "requirement_2", True)  # type: ignore
+        raw = scraper.fetch_raw(types)
+        if cookie is not None:
+            cookie_pool.charge(
+                cookie, sum(len(pages) for pages in raw.values()) - len(types)
+            )
+        works.extend(parser.parse(scraper, raw))
+        writer.submit(
+            task.douban_person_id,
+            partial(
+                crud.save_marking_result,
+                task=task,
+                filter="requirement_2",
+                create=crud.create_douban_works_mutil,
+                data=works,
+            ),
+            partial(
+                crud.release_marking, task=task, filter="requirement_2", commit=False
+            ),
+        )
+        if cookie is not None:
+            cookie_pool.report_ok(cookie)
+        logging.info(f"Scraped {len(works)} works for [{task.douban_person_id}]")
     except Exception as e:
+        if cookie is not None and isinstance(e, scraper.LoginRequiredError):
+            cookie_pool.report_login_required(cookie)
         logging.error(f"Error occurred while scraping [{task.douban_person_id}]: {e}")
+        raise
+
+
+def fail_task(task: schemas.Marking, error: Exception, writer: DBWriter):
+    """
+    任务失败且不再重试时记录失败次数和错误类型，按退避时间释放租约。
+    熔断（请求没有发出）、cookie 失效和等待 cookie 超时不是任务本身的问题，只释放租约，不计入失败次数。
+    """
+    if isinstance(
+        error,
+        (
+            CircuitOpenError,
+            CookieUnavailableError,
+            DoubanWorkScraper.LoginRequiredError,
+        ),
+    ):
+        writer.submit(
+            task.douban_person_id,
+            partial(
+                crud.release_marking, task=task, filter="requirement_2", commit=False
+            ),
+        )
+        return
+    writer.submit(
+        task.douban_person_id,
+        partial(
+            crud.fail_marking,
+            task=task,
+            filter="requirement_2",
+            error=error_name(error),
+            permanent=is_permanent(error),
+            commit=False,
+        ),
+    )
+
+
+def renew_tasks(tasks: list[schemas.Marking], writer: DBWriter):
+    """定期为执行中和等待重试的任务续租，任务完成前租约不会过期"""
+    writer.submit(
+        "lease heartbeat",
+        partial(
+            crud.renew_marking_leases,
+            tasks=tasks,
+            filter="requirement_2",
+            lease_expires_at=datetime.now() + timedelta(seconds=crud.LEASE_SECONDS),
+            commit=False,
+        ),
+    )
 
 
 def main(
     cookies_list: list[dict],
     task_nums: int = 1,
     seconds: int = 10,
-    every_times_sleep: int = 2,
+    request_rate: float | None = None,
     proxy_url: str | None = None,
+    parse_workers: int | None = None,
+    proxy_urls: list[str] | None = None,
 ):
     # 配置logging
     init_logger("run[2]")
-    # 实例化 CookieRotator
-    rotator = CookieRotator(cookies_list)
-    db = database.SessionLocal()
-    try:
-        while True:
-            unfinished_tasks = crud.get_unfinished_marking_mutil(
-                db, "requirement_2", task_nums
-            )
-            if len(unfinished_tasks) == 0:
-                logging.info("No unfinished tasks, exiting...")
-                break
+    # 并发数在 1 到 task_nums 之间按请求结果自动调整
+    controller = AIMDController(task_nums)
+    # 按接口熔断，上游故障时快速失败并暂停领取任务
+    breakers = CircuitBreakers()
+    client.configure(
+        proxy_url=proxy_url,
+        proxy_urls=proxy_urls,
+        rate=request_rate,
+        controller=controller,
+        breakers=breakers,
+    )
+    # 多个线程和进程共用的 cookie 池
+    cookie_pool = CookiePool(cookies_list)
+    writer = DBWriter().start()
+    parser = ParsePool(parse_workers)
+    # 生产线程使用独立的 session
+    feeder_db = database.SessionLocal()
+
+    # requirement_1 已记录的影视作品数，由生产线程随任务一起查出
+    works_counts: dict[str, str | None] = {}
 
-            with ThreadPoolExecutor(max_workers=task_nums) as executor:  # 调整线程数
-                futures = [
-                    executor.submit(
-                        scrape_task, task, db, rotator, proxy_url, every_times_sleep
-                    )
-                    for task in unfinished_tasks
-                ]
-                for future in as_completed(futures):
-                    try:
-                        future.result()  # 获取任务结果
-                    except Exception as e:
-                        logging.error(f"Error in task: {e}")
-            logging.info(f"Sleeping for {seconds} seconds...")
-            time.sleep(seconds)
+    def fetch_tasks(limit: int):
+        tasks = crud.claim_marking_mutil(feeder_db, "requirement_2", limit)
+        works_counts.update(
+            crud.get_works_counts(feeder_db, [task.douban_person_id for task in tasks])
+        )
+        return tasks
 
+    scheduler = TaskScheduler(
+        fetch_tasks,
+        lambda task: scrape_task(
+            task,
+            writer,
+            parser,
+            cookie_pool,
+            proxy_url,
+            works_counts.pop(task.douban_person_id, None),
+        ),
+        key=lambda task: task.douban_person_id,
+        workers=task_nums,
+        controller=controller,
+        on_give_up=lambda task, error: fail_task(task, error, writer),
+        on_heartbeat=lambda tasks: renew_tasks(tasks, writer),
+        on_reclaim=partial(crud.adopt_claim, filter="requirement_2"),
+        breakers=breakers,
+        # 没有可用的 cookie 时暂停领取，避免领到任务后等待 cookie 而租约过期
+        ready_at=cookie_pool.ready_at,
+        rate=task_nums / seconds,
+    )
+    try:
+        scheduler.run()
     except KeyboardInterrupt:
         logging.info("Program interrupted by user. Exiting...")
     finally:
-        db.close()
+        feeder_db.close()
+        writer.close()
+        parser.close()
+        cookie_pool.close()
 
 
 if __name__ == "__main__":
@@ -108,10 +223,22 @@ if __name__ == "__main__":
             "__utmb": "30149280.16.10.1736823226",
         },
     ]
-    # 任务数
+    # 最大并发任务数
     TASK_NUMS = 1
-    # 每轮休眠秒数
+    # 任务启动速率：每秒最多启动 TASK_NUMS / SECONDS 个任务（平均每 SECONDS 秒启动 TASK_NUMS 个）
     SECONDS = 20
-    # 每次请求休眠秒数
-    EVERY_TIMES_SLEEP = 3
-    main(COOKIES_LIST, TASK_NUMS, SECONDS, EVERY_TIMES_SLEEP, PROXY_URL)
+    # 每个 host 每秒最多发出的请求数（所有线程和进程共享，翻页请求同时发出），None 表示使用 HOST_RATES
+    REQUEST_RATE = None
+    # 解析进程数，0 表示在抓取线程中解析，None 表示 CPU 核数 - 1
+    PARSE_WORKERS = None
+    # 代理池，按健康状况为每个请求挑选代理（PROXY_URL 为 None 时生效）
+    PROXY_URLS = []
+    main(
+        COOKIES_LIST,
+        TASK_NUMS,
+        SECONDS,
+        REQUEST_RATE,
+        PROXY_URL,
+        PARSE_WORKERS,
+        PROXY_URLS,
+    )
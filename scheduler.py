@@ -0,0 +1,302 @@
+import heapq
+import itertools
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Optional, Sequence
+
+from circuit_breaker import (
+    CircuitBreakers,
+    CircuitOpenError,
+    RetryBudget,
+    is_retryable,
+    retry_delay,
+)
+from concurrency import AIMDController
+from rate_limiter import RateLimiter
+
+_STOP = object()
+
+
+class TaskScheduler:
+    """
+    流式生产者/消费者调度器。
+    生产线程不断从数据库补充有界队列，常驻工作线程从队列取任务执行，
+    任务的启动节奏由限速器控制，而不是等待每一批中最慢的任务。
+    任务失败后不在工作线程中等待重试：值得重试的任务按指数退避放回延迟队列，由生产线程到期后重新入队，
+    重试次数受全局重试预算限制；不再重试的任务交给 on_give_up。
+    有接口熔断或 ready_at 表示资源（例如 cookie）暂不可用时，生产线程暂停领取新任务。
+    执行中和等待重试的任务定期交给 on_heartbeat 续租；租约仍然过期、被本进程重新领取时交给 on_reclaim。
+    """
+
+    def __init__(
+        self,
+        fetch_tasks: Callable[[int], Sequence[Any]],
+        handler: Callable[[Any], Any],
+        key: Callable[[Any], str],
+        workers: int = 1,
+        rate: Optional[float] = None,
+        queue_size: Optional[int] = None,
+        poll_seconds: float = 1,
+        controller: Optional[AIMDController] = None,
+        report_seconds: float = 60,
+        on_give_up: Optional[Callable[[Any, Exception], Any]] = None,
+        on_heartbeat: Optional[Callable[[list], Any]] = None,
+        heartbeat_seconds: float = 60,
+        on_reclaim: Optional[Callable[[Any, Any], Any]] = None,
+        max_retries: int = 2,
+        retry_base_seconds: float = 2,
+        retry_budget: Optional[RetryBudget] = None,
+        breakers: Optional[CircuitBreakers] = None,
+        ready_at: Optional[Callable[[], float]] = None,
+    ):
+        """
+        :param fetch_tasks: 传入数量上限，领取并返回尚未交出的任务
+        :param handler: 在工作线程中执行单个任务
+        :param key: 任务的唯一标识，用于防止同一任务重复入队
+        :param workers: 常驻工作线程数
+        :param rate: 每秒最多启动的任务数，None 表示不限速
+        :param queue_size: 队列容量，默认为工作线程数的 2 倍
+        :param poll_seconds: 没有新任务时生产线程的轮询间隔
+        :param controller: 并发控制器，此时 workers 为并发上限，实际并发数由控制器调整
+        :param report_seconds: 输出并发控制器状态的间隔
+        :param on_give_up: 任务失败且不再重试时以 (任务, 异常) 调用，例如记录失败并释放租约
+        :param on_heartbeat: 每隔 heartbeat_seconds 以执行中和等待重试的全部任务调用，例如续租
+        :param heartbeat_seconds: on_heartbeat 的调用间隔，应明显短于租约时长
+        :param on_reclaim: 领取到的任务已在途时以 (在途任务, 新领取的任务) 调用，例如让在途任务改用新的领取标记
+        :param max_retries: 每个任务最多重试的次数，熔断导致的失败不计入
+        :param retry_base_seconds: 第一次重试前的等待秒数，之后每次加倍
+        :param retry_budget: 全局重试预算，默认每启动 10 个任务允许 1 次重试
+        :param breakers: 客户端使用的熔断状态，有接口熔断时暂停领取新任务
+        :param ready_at: 返回执行任务所需的资源恢复可用的时间戳，在此之前暂停领取新任务，例如 CookiePool.ready_at
+        """
+        self.fetch_tasks = fetch_tasks
+        self.handler = handler
+        self.key = key
+        self.workers = workers
+        self.limiter = RateLimiter(rate, burst=workers) if rate else None
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size or workers * 2)
+        self.poll_seconds = poll_seconds
+        self.controller = controller
+        self.report_seconds = report_seconds
+        self.on_give_up = on_give_up
+        self.on_heartbeat = on_heartbeat
+        self.heartbeat_seconds = heartbeat_seconds
+        self.on_reclaim = on_reclaim
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_budget = retry_budget or RetryBudget()
+        self.breakers = breakers
+        self.ready_at = ready_at
+        self.stop_event = threading.Event()
+        # 已入队、正在执行或等待重试的任务
+        self._inflight: dict[str, Any] = {}
+        self._inflight_lock = threading.Lock()
+        # 等待重试的任务 (到期时间, 序号, 任务, 异常) 和每个任务已重试的次数
+        self._retries: list[tuple[float, int, Any, Exception]] = []
+        self._retry_seq = itertools.count()
+        self._attempts: dict[str, int] = {}
+
+    def _wait_for_breakers(self) -> bool:
+        """有接口熔断时等待一个轮询间隔，返回是否在等待"""
+        if self.breakers is None:
+            return False
+        wait = self.breakers.open_until() - time.time()
+        if wait <= 0:
+            return False
+        logging.warning(f"Circuit open, feeder paused for {wait:.0f} seconds")
+        time.sleep(min(wait, self.poll_seconds))
+        return True
+
+    def _wait_for_resources(self) -> bool:
+        """执行任务所需的资源暂不可用时等待一个轮询间隔，返回是否在等待"""
+        if self.ready_at is None:
+            return False
+        try:
+            wait = self.ready_at() - time.time()
+        except Exception as e:
+            logging.error(f"Error occurred while checking resources: {e}")
+            wait = self.poll_seconds
+        if wait <= 0:
+            return False
+        logging.warning(f"Resources unavailable, feeder paused for {wait:.0f} seconds")
+        time.sleep(min(wait, self.poll_seconds))
+        return True
+
+    def _due_retries(self, limit: int) -> list:
+        """取出最多 limit 个已到重试时间的任务"""
+        now = time.time()
+        tasks = []
+        with self._inflight_lock:
+            while self._retries and self._retries[0][0] <= now and len(tasks) < limit:
+                tasks.append(heapq.heappop(self._retries)[2])
+        return tasks
+
+    def _feed(self):
+        while not self.stop_event.is_set():
+            if self._wait_for_breakers() or self._wait_for_resources():
+                continue
+            free = self.queue.maxsize - self.queue.qsize()
+            if free <= 0:
+                time.sleep(self.poll_seconds)
+                continue
+            # 到期的重试优先入队，它们仍在 _inflight 中
+            retries = self._due_retries(free)
+            for task in retries:
+                self.queue.put(task)
+            free -= len(retries)
+            if free <= 0:
+                continue
+            try:
+                # fetch_tasks 以领取方式取任务，不会返回已交出的任务，只取空位数量即可
+                tasks = self.fetch_tasks(free)
+            except Exception as e:
+                logging.error(f"Error occurred while fetching tasks: {e}")
+                time.sleep(self.poll_seconds)
+                continue
+            new_tasks = []
+            reclaimed = []
+            with self._inflight_lock:
+                for task in tasks:
+                    task_key = self.key(task)
+                    if task_key in self._inflight:
+                        reclaimed.append((self._inflight[task_key], task))
+                    elif len(new_tasks) < free:
+                        self._inflight[task_key] = task
+                        new_tasks.append(task)
+                inflight = len(self._inflight)
+            for live_task, task in reclaimed:
+                self._reclaim(live_task, task)
+            if not new_tasks:
+                if inflight == 0:
+                    logging.info("No unfinished tasks, exiting...")
+                    break
+                if not retries:
+                    time.sleep(self.poll_seconds)
+                continue
+            for task in new_tasks:
+                self.queue.put(task)
+        for _ in range(self.workers):
+            self.queue.put(_STOP)
+
+    def _retry_at(self, task_key: str, e: Exception) -> Optional[float]:
+        """失败任务的重试时间，不再重试时返回 None"""
+        if not is_retryable(e):
+            return None
+        if isinstance(e, CircuitOpenError):
+            # 请求没有发出，熔断恢复后重试，不占用重试次数和预算
+            return e.retry_at
+        attempt = self._attempts.get(task_key, 0) + 1
+        if attempt > self.max_retries:
+            return None
+        if not self.retry_budget.try_spend():
+            logging.warning(f"Retry budget exhausted, giving up [{task_key}]")
+            return None
+        self._attempts[task_key] = attempt
+        delay = retry_delay(attempt, self.retry_base_seconds)
+        logging.info(
+            f"Retrying [{task_key}] in {delay:.1f} seconds "
+            f"(attempt {attempt}/{self.max_retries})"
+        )
+        return time.time() + delay
+
+    def _work(self):
+        while True:
+            task = self.queue.get()
+            if task is _STOP:
+                return
+            task_key = self.key(task)
+            retry_at = None
+            error = None
+            try:
+                if self.stop_event.is_set():
+                    continue
+                if self.limiter is not None:
+                    self.limiter.acquire()
+                if task_key not in self._attempts:
+                    self.retry_budget.deposit()
+                if self.controller is not None:
+                    with self.controller.slot():
+                        self.handler(task)
+                else:
+                    self.handler(task)
+            except Exception as e:
+                error = e
+                retry_at = self._retry_at(task_key, e)
+                if retry_at is None:
+                    self._give_up(task, e)
+            finally:
+                with self._inflight_lock:
+                    if retry_at is not None:
+                        heapq.heappush(
+                            self._retries,
+                            (retry_at, next(self._retry_seq), task, error),
+                        )
+                    else:
+                        self._inflight.pop(task_key, None)
+                        self._attempts.pop(task_key, None)
+
+    def _reclaim(self, live_task: Any, task: Any):
+        if self.on_reclaim is None:
+            return
+        try:
+            self.on_reclaim(live_task, task)
+        except Exception as e:
+            logging.error(f"Error in on_reclaim for [{self.key(task)}]: {e}")
+
+    def _heartbeat(self):
+        if self.on_heartbeat is None:
+            return
+        with self._inflight_lock:
+            tasks = list(self._inflight.values())
+        if not tasks:
+            return
+        try:
+            self.on_heartbeat(tasks)
+        except Exception as e:
+            logging.error(f"Error in on_heartbeat: {e}")
+
+    def _give_up(self, task: Any, error: Exception):
+        if self.on_give_up is None:
+            return
+        try:
+            self.on_give_up(task, error)
+        except Exception as e:
+            logging.error(f"Error in on_give_up for [{self.key(task)}]: {e}")
+
+    def run(self):
+        """阻塞运行直到没有未完成的任务；Ctrl+C 时等待在途任务结束后退出"""
+        threads = [threading.Thread(target=self._feed, name="feeder", daemon=True)]
+        threads += [
+            threading.Thread(target=self._work, name=f"worker-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        reported_at = heartbeat_at = time.monotonic()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.5)
+                    if time.monotonic() - heartbeat_at >= self.heartbeat_seconds:
+                        heartbeat_at = time.monotonic()
+                        self._heartbeat()
+                    if (
+                        self.controller is not None
+                        and time.monotonic() - reported_at >= self.report_seconds
+                    ):
+                        reported_at = time.monotonic()
+                        logging.info(f"Concurrency: {self.controller.metrics()}")
+                        logging.info(
+                            f"Retries: {self.retry_budget.retried} retried, "
+                            f"{self.retry_budget.rejected} rejected by budget"
+                        )
+        except KeyboardInterrupt:
+            self.stop_event.set()
+            for thread in threads:
+                thread.join()
+            # 等待重试的任务不再执行，按最近一次失败交给 on_give_up
+            for _, _, task, error in self._retries:
+                self._give_up(task, error)
+            raise
@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+from douban import html_parser
+from douban.requirement_1 import DoubanPersonScraper
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+# (夹具文件, 期望的获奖数)：
+# 有获奖链接时取链接中的数字；有获奖栏目但没有链接时为 "0"，requirement_3 据此跳过任务；
+# 没有获奖栏目（页面改版或不完整）时无法判断，保持 None
+PERSONS = [
+    ("person_awards.html", "12"),
+    ("person_no_awards.html", "0"),
+    ("person_no_awards_section.html", None),
+]
+
+
+def parse_fixture(name: str) -> dict:
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        html = f.read()
+    return DoubanPersonScraper("27246769").parse(html).model_dump()
+
+
+@pytest.fixture(params=["lxml", "html.parser"])
+def parser(request):
+    previous = html_parser.PARSER
+    html_parser.configure(request.param)
+    yield request.param
+    html_parser.configure(previous)
+
+
+@pytest.mark.parametrize("name, awards_count", PERSONS)
+def test_awards_count(parser, name, awards_count):
+    assert parse_fixture(name)["awards_count"] == awards_count
+
+
+def test_parse_person(parser):
+    person = parse_fixture("person_awards.html")
+    assert person["douban_id"] == "周杰伦 Jay Chou"
+    assert person["gender"] == "男"
+    assert person["imdb_id"] == "nm1201563"
+    assert person["douban_followers"] == "12345"
+    assert person["introduction"] == "华语流行乐男歌手。"
+    assert person["homepage_pictures_count"] == "320"
+    assert person["homepage_contributors"] == "8"
@@ -0,0 +1,55 @@
+import json
+import os
+
+import pytest
+
+from douban import html_parser
+from douban.requirement_5 import DoubanSubjectScraper
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+# (夹具文件, 类型, 条目 id)，期望结果按文件名保存在 subject_expected.json 中
+SUBJECTS = [
+    ("subject_movie.html", "movie", "10604086"),
+    ("subject_book.html", "book", "1"),
+    ("subject_music.html", "music", "1"),
+    # 表演者不是 #info 中的第三个子元素，旧的按位置选取的解析返回 None
+    ("subject_music_no_aka.html", "music", "2"),
+]
+
+
+def parse_fixture(name: str, type: str, subject_id: str) -> dict:
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        html = f.read()
+    return DoubanSubjectScraper(subject_id, type).parse_subject(html).model_dump()  # type: ignore
+
+
+@pytest.fixture(params=["lxml", "html.parser"])
+def parser(request):
+    previous = html_parser.PARSER
+    html_parser.configure(request.param)
+    yield request.param
+    html_parser.configure(previous)
+
+
+@pytest.mark.parametrize("name, type, subject_id", SUBJECTS)
+def test_parse_subject(parser, name, type, subject_id):
+    with open(os.path.join(FIXTURES, "subject_expected.json"), encoding="utf-8") as f:
+        expected = json.load(f)
+    assert parse_fixture(name, type, subject_id) == expected[name]
+
+
+def test_music_performer_inside_label(parser):
+    subject = parse_fixture("subject_music_no_aka.html", "music", "2")
+    assert subject["performer"] == ["周杰伦"]
+    assert subject["performer_url"] == ["https://music.douban.com/musician/104515/"]
+
+
+if __name__ == "__main__":
+    # 解析逻辑有意改变时，在项目根目录运行 python -m tests.test_requirement_5 重新生成期望结果
+    expected = {name: parse_fixture(name, type, id) for name, type, id in SUBJECTS}
+    with open(
+        os.path.join(FIXTURES, "subject_expected.json"), "w", encoding="utf-8"
+    ) as f:
+        json.dump(expected, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
@@ -8,3 +8,45 @@ def extract_numbers(s: str) -> list[str]:
     :return: 包含数字的列表（以字符串形式返回）
     """
     return re.findall(r"\d+", s)
+
+
+def iter_excel_column(path: str, column: str, chunk_size: int = 10000):
+    """
+    以只读模式流式读取 xlsx 中的一列，每次返回 chunk_size 个非空值，不会把整个表读进内存。
+    :param path: xlsx 文件路径
+    :param column: 表头中的列名
+    :param chunk_size: 每块的行数
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        if column not in header:
+            raise ValueError(f"Column {column} not found in {path}")
+        index = header.index(column)
+        chunk = []
+        for row in rows:
+            if index < len(row) and row[index] is not None:
+                chunk.append(str(row[index]))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        workbook.close()
+
+
+def iter_csv_column(path: str, column: str, chunk_size: int = 10000):
+    """
+    分块读取 csv 中的一列，每次返回 chunk_size 个非空值。
+    :param path: csv 文件路径
+    :param column: 表头中的列名
+    :param chunk_size: 每块的行数
+    """
+    import pandas as pd
+
+    for df in pd.read_csv(path, usecols=[column], chunksize=chunk_size):
+        yield df[column].dropna().astype(str).tolist()